@@ -1,8 +1,44 @@
-from utils.serve import run_server
-from utils.driver import driver
+import argparse
+from utils.serve import run_server, SERVER_MODES
+from utils.driver import driver, OUTPUT_PLAYLIST
+from utils.multiSource import ingest_sources, load_sources
+from utils.streamProber import StreamProber
+from utils.playlistViews import DEFAULT_PROFILES_FILE
+from utils.metrics import registry, profiled
 
 
-m3u_link = driver();
+parser = argparse.ArgumentParser(description='Refresh the playlist, then serve it')
+parser.add_argument('--port', type=int, default=8123, help='Port to run the server on (default: 8123)')
+parser.add_argument('--mode', choices=sorted(SERVER_MODES), default='threaded',
+                    help='Serve connections concurrently or one at a time (default: threaded)')
+parser.add_argument('--refresh-interval', type=float, default=None,
+                    help='Minutes between background refreshes (default: only on /refresh)')
+parser.add_argument('--sources', default=None,
+                    help='File with several playlist URLs to merge, instead of the browser-extracted link')
+parser.add_argument('--prefer', choices=['order', 'fastest'], default='order',
+                    help='With --sources, which source wins for a channel listed by several (default: order)')
+parser.add_argument('--probe-streams', choices=['drop', 'move'], default=None,
+                    help="Check every kept stream and drop dead ones, or move them to a 'Dead' group")
+parser.add_argument('--epg', action='store_true',
+                    help="Also fetch the provider's guide, trimmed to the kept channels, served at /epg.xml.gz")
+parser.add_argument('--profile-dir', default=None,
+                    help='Dump a cProfile of every refresh into this directory')
+parser.add_argument('--view-profiles', default=DEFAULT_PROFILES_FILE,
+                    help=f'JSON file of named filtered views, served at /profile/<name>.m3u (default: {DEFAULT_PROFILES_FILE})')
+args = parser.parse_args()
 
-if m3u_link:
-    run_server(8123, 'outputs/output.m3u')
+prober = StreamProber(mode=args.probe_streams) if args.probe_streams else None
+if prober:
+    registry.expose('iptv_probe', prober.stats, help_text='Stream probe outcomes.')
+
+if args.sources:
+    refresh = profiled(lambda: ingest_sources(load_sources(args.sources), OUTPUT_PLAYLIST, prefer=args.prefer),
+                       args.profile_dir)
+    refreshed = refresh()
+else:
+    refresh = profiled(lambda: driver(True, prober, epg=args.epg), args.profile_dir)
+    refreshed = profiled(driver, args.profile_dir)(prober=prober, epg=args.epg);
+
+if refreshed:
+    refresh_interval = args.refresh_interval * 60 if args.refresh_interval else None
+    run_server(args.port, OUTPUT_PLAYLIST, args.mode, refresh_interval, refresh, args.view_profiles)
@@ -0,0 +1,62 @@
+import io
+import unittest
+import contextlib
+from unittest import mock
+
+from utils import benchmarkSuite
+
+
+def report(results, spreads=None, duration=5.0):
+    return {'settings': {'repeat': 5, 'duration': duration}, 'results': results, 'spreads': spreads or {}}
+
+
+class CompareTest(unittest.TestCase):
+    def test_real_slowdown_is_flagged(self):
+        baseline = report({'declutter-100000': {'seconds': 1.0, 'entries_per_sec': 100000.0}})
+        current = report({'declutter-100000': {'seconds': 1.5, 'entries_per_sec': 66666.0}})
+        self.assertEqual({(name, metric) for name, metric, _, _ in benchmarkSuite.compare(current, baseline)},
+                         {('declutter-100000', 'seconds'), ('declutter-100000', 'entries_per_sec')})
+
+    def test_noisy_benchmark_is_allowed_its_spread(self):
+        # A 40 ms benchmark whose runs varied by 20% may come out 44% slower
+        baseline = report({'index-10000': {'seconds': 0.064}}, {'index-10000': {'seconds': 0.2}})
+        current = report({'index-10000': {'seconds': 0.092}}, {'index-10000': {'seconds': 0.05}})
+        self.assertEqual(benchmarkSuite.compare(current, baseline), [])
+
+    def test_differences_under_the_noise_floor_are_ignored(self):
+        baseline = report({'log-scan': {'seconds': 0.001, 'peak_rss_mb': 20.0}})
+        current = report({'log-scan': {'seconds': 0.003, 'peak_rss_mb': 21.5}})
+        self.assertEqual(benchmarkSuite.compare(current, baseline), [])
+
+    def test_p99_is_only_gated_on_long_load_tests(self):
+        baseline = {'serve': {'p99_ms': 20.0}}
+        current = {'serve': {'p99_ms': 60.0}}
+        self.assertEqual(benchmarkSuite.compare(report(current), report(baseline)), [])
+        self.assertEqual(benchmarkSuite.compare(report(current, duration=60.0), report(baseline, duration=60.0)),
+                         [('serve', 'p99_ms', 20.0, 60.0)])
+
+
+class ConfirmedRegressionsTest(unittest.TestCase):
+    def confirm(self, reruns):
+        baseline = report({'serve': {'requests_per_sec': 700.0}, 'epg': {'seconds': 0.5}})
+        current = report({'serve': {'requests_per_sec': 200.0}, 'epg': {'seconds': 0.5}})
+        with mock.patch.object(benchmarkSuite, 'run_suite', side_effect=reruns) as run_suite, \
+             contextlib.redirect_stdout(io.StringIO()):
+            regressions = benchmarkSuite.confirmed_regressions(current, baseline, 0.25, [10000], 5, 5.0)
+        return regressions, run_suite
+
+    def test_a_passing_rerun_clears_the_regression(self):
+        regressions, run_suite = self.confirm([report({'serve': {'requests_per_sec': 680.0}})])
+        self.assertEqual(regressions, [])
+        self.assertEqual(run_suite.call_count, 1)
+        self.assertEqual(run_suite.call_args.kwargs['names'], ['serve'])
+
+    def test_a_regression_that_persists_is_reported(self):
+        slow = report({'serve': {'requests_per_sec': 210.0}})
+        regressions, run_suite = self.confirm([slow] * benchmarkSuite.CONFIRM_RUNS)
+        self.assertEqual(regressions, [('serve', 'requests_per_sec', 700.0, 210.0)])
+        self.assertEqual(run_suite.call_count, benchmarkSuite.CONFIRM_RUNS)
+
+
+if __name__ == '__main__':
+    unittest.main()
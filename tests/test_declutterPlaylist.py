@@ -0,0 +1,69 @@
+import os
+import io
+import tempfile
+import unittest
+import contextlib
+
+from utils.benchmarkIncremental import churn_playlist
+from utils.declutterPlaylist import SNAPSHOT_SUFFIX, build_stages, declutter_playlist
+from utils.syntheticPlaylist import generate_playlist
+
+ENTRIES = 5000
+
+
+class IncrementalDeclutterTest(unittest.TestCase):
+    def setUp(self):
+        workdir = tempfile.TemporaryDirectory()
+        self.addCleanup(workdir.cleanup)
+        self.workdir = workdir.name
+        self.previous_input = os.path.join(self.workdir, "previous.m3u")
+        self.current_input = os.path.join(self.workdir, "current.m3u")
+        generate_playlist(self.previous_input, ENTRIES)
+        self.changed = churn_playlist(self.previous_input, self.current_input, 0.01)
+        self.output = os.path.join(self.workdir, "output.m3u")
+        self.stages = build_stages("newuser", "newpass", ["FR", "DE"])
+
+    def declutter(self, input_filepath, output_filepath, incremental=True, stages=None):
+        with contextlib.redirect_stdout(io.StringIO()):
+            return declutter_playlist(input_filepath, output_filepath, stages=stages or self.stages,
+                                      incremental=incremental)
+
+    def read(self, filepath):
+        with open(filepath, 'rb') as file:
+            return file.read()
+
+    def test_splices_unchanged_chunks_into_the_same_output(self):
+        self.declutter(self.previous_input, self.output)
+        self.assertTrue(os.path.exists(self.output + SNAPSHOT_SUFFIX))
+
+        stats = self.declutter(self.current_input, self.output)
+        full_output = os.path.join(self.workdir, "full.m3u")
+        full_stats = self.declutter(self.current_input, full_output, incremental=False)
+
+        self.assertEqual(self.read(self.output), self.read(full_output))
+        self.assertEqual(stats['entries_in'], full_stats['entries_in'])
+        self.assertEqual(stats['entries_out'], full_stats['entries_out'])
+        # Only the chunks around the changed entries are re-run
+        self.assertGreater(stats['entries_reused'], ENTRIES - 20 * self.changed)
+        self.assertLess(stats['entries_reused'], ENTRIES)
+
+    def test_snapshot_is_ignored_once_the_output_changes(self):
+        self.declutter(self.previous_input, self.output)
+        with open(self.output, 'a', encoding='utf-8') as output_file:
+            output_file.write("#EXTINF:-1,Edited by hand\nhttp://example/edited.ts\n")
+
+        stats = self.declutter(self.previous_input, self.output)
+        self.assertEqual(stats['entries_reused'], 0)
+
+    def test_different_stages_rebuild(self):
+        self.declutter(self.previous_input, self.output)
+        stats = self.declutter(self.previous_input, self.output, stages=build_stages("other", "pass", ["FR"]))
+        self.assertEqual(stats['entries_reused'], 0)
+
+        full_output = os.path.join(self.workdir, "full.m3u")
+        self.declutter(self.previous_input, full_output, incremental=False, stages=build_stages("other", "pass", ["FR"]))
+        self.assertEqual(self.read(self.output), self.read(full_output))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,50 @@
+import io
+import os
+import tempfile
+import unittest
+import contextlib
+from unittest import mock
+
+from utils import driver
+
+STALE_LINK = "http://provider.example:8080/get.php?username=old&password=old&type=m3u_plus&output=ts"
+FRESH_LINK = "http://provider.example:8080/get.php?username=new&password=new&type=m3u_plus&output=ts"
+
+
+class GetLinkFromBrowserTest(unittest.TestCase):
+    def setUp(self):
+        logs_folder = tempfile.TemporaryDirectory()
+        self.addCleanup(logs_folder.cleanup)
+        self.logs_folder = logs_folder.name
+        # A previous run's log, still holding its link
+        with open(os.path.join(self.logs_folder, "iptvlogs.txt"), 'w') as log:
+            log.write(f"[echo] m3uLink = {STALE_LINK}\n")
+        for patcher in (mock.patch.object(driver, 'LOGS_FOLDER', self.logs_folder),
+                        mock.patch.object(driver, 'store_link')):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def get_link(self, runner_link):
+        with mock.patch.object(driver, 'run_ui_automation_script', return_value=runner_link), \
+             contextlib.redirect_stdout(io.StringIO()):
+            return driver.get_m3u_link_from_browser()
+
+    def test_timeout_does_not_fall_back_to_an_old_log(self):
+        self.assertIsNone(self.get_link(None))
+        driver.store_link.assert_not_called()
+
+    def test_uses_and_caches_the_runners_link(self):
+        self.assertEqual(self.get_link(FRESH_LINK), FRESH_LINK)
+        self.assertEqual(driver.store_link.call_args[0][0], FRESH_LINK)
+
+    def test_cleans_up_older_logs(self):
+        older = os.path.join(self.logs_folder, "iptvlogs (1).txt")
+        with open(older, 'w') as log:
+            log.write("")
+        os.utime(older, (0, 0))
+        self.get_link(FRESH_LINK)
+        self.assertEqual(os.listdir(self.logs_folder), ["iptvlogs.txt"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,143 @@
+import os
+import sys
+import time
+import asyncio
+import tempfile
+import textwrap
+import unittest
+
+from utils.runUIAutomationScript import run_ui_automation_async
+
+LINK = "http://provider.example:8080/get.php?username=fake&password=fake&type=m3u_plus&output=ts"
+
+# Stands in for Firefox: 'mode' picks how it behaves, and the macro's log line is
+# written to iptvlogs.txt in 'logs_folder' the way UI.Vision's savelog would
+FAKE_BROWSER = textwrap.dedent('''
+    import os, sys, time, subprocess
+    mode, logs_folder, pid_file = sys.argv[1:4]
+
+    def write_log():
+        with open(os.path.join(logs_folder, "iptvlogs.txt"), "w") as log:
+            log.write("[status] Playing macro iptv/freeiptv2023\\n")
+            log.write("[echo] m3uLink = %s\\n" % sys.argv[4])
+
+    if mode == "child":
+        with open(pid_file, "a") as pids:
+            pids.write(" " + str(os.getpid()))
+        time.sleep(float(sys.argv[5]))
+        write_log()
+        sys.exit(0)
+
+    with open(pid_file, "w") as pids:
+        pids.write(str(os.getpid()))
+    if mode == "link":
+        time.sleep(0.5)
+        write_log()
+        time.sleep(60)
+    elif mode == "hang":
+        child = subprocess.Popen([sys.executable, "-c", "import time; time.sleep(60)"])
+        with open(pid_file, "a") as pids:
+            pids.write(" " + str(child.pid))
+        time.sleep(60)
+    elif mode == "handoff":
+        # Like Firefox's launcher handing the URL to a running browser, then exiting;
+        # the browser doesn't share the launcher's output pipes
+        subprocess.Popen([sys.executable, __file__, "child", logs_folder, pid_file, sys.argv[4], sys.argv[5]],
+                         stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        sys.exit(0)
+    elif mode == "fail":
+        sys.exit(3)
+''')
+
+
+def _is_running(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    # A killed process nobody has reaped yet still answers signal 0
+    try:
+        with open(f"/proc/{pid}/stat") as stat:
+            return stat.read().rsplit(')', 1)[1].split()[0] != 'Z'
+    except OSError:
+        return True
+
+
+def _wait_until_gone(pid, seconds=5.0):
+    deadline = time.monotonic() + seconds
+    while _is_running(pid) and time.monotonic() < deadline:
+        time.sleep(0.05)
+    return not _is_running(pid)
+
+
+class RunUIAutomationTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        # The output logger keeps its file open for the rest of the run
+        cls.output_dir = tempfile.TemporaryDirectory(ignore_cleanup_errors=True)
+        cls.output_log = os.path.join(cls.output_dir.name, "ui_automation.log")
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.output_dir.cleanup()
+
+    def setUp(self):
+        workdir = tempfile.TemporaryDirectory()
+        self.addCleanup(workdir.cleanup)
+        self.logs_folder = os.path.join(workdir.name, "logs")
+        os.makedirs(self.logs_folder)
+        self.pid_file = os.path.join(workdir.name, "pids")
+        self.fake_browser = os.path.join(workdir.name, "fake_browser.py")
+        with open(self.fake_browser, 'w') as fake:
+            fake.write(FAKE_BROWSER)
+
+    def run_fake(self, mode, timeout, log_delay=0.0):
+        command = [sys.executable, self.fake_browser, mode, self.logs_folder, self.pid_file, LINK, str(log_delay)]
+        started = time.monotonic()
+        link = asyncio.run(run_ui_automation_async(command, timeout, logs_folder=self.logs_folder,
+                                                   output_log_file=self.output_log))
+        return link, time.monotonic() - started
+
+    def pids(self):
+        with open(self.pid_file) as pids:
+            return [int(pid) for pid in pids.read().split()]
+
+    def test_returns_link_without_waiting_for_the_browser(self):
+        link, elapsed = self.run_fake("link", timeout=30)
+        self.assertEqual(link, LINK)
+        self.assertLess(elapsed, 10)
+        self.assertTrue(_wait_until_gone(self.pids()[0]))
+
+    @unittest.skipIf(os.name == 'nt', "checks the POSIX process group")
+    def test_timeout_kills_the_process_tree(self):
+        link, elapsed = self.run_fake("hang", timeout=1.5)
+        self.assertIsNone(link)
+        self.assertLess(elapsed, 10)
+        browser, helper = self.pids()
+        self.assertTrue(_wait_until_gone(browser))
+        self.assertTrue(_wait_until_gone(helper))
+
+    def test_keeps_watching_after_the_launcher_exits(self):
+        # The log lands well after the launcher is gone
+        link, elapsed = self.run_fake("handoff", timeout=30, log_delay=3.0)
+        self.assertEqual(link, LINK)
+        self.assertGreaterEqual(elapsed, 3.0)
+
+    @unittest.skipIf(os.name == 'nt', "checks the POSIX process group")
+    def test_handoff_without_a_link_times_out(self):
+        link, elapsed = self.run_fake("handoff", timeout=2, log_delay=60)
+        self.assertIsNone(link)
+        self.assertGreaterEqual(elapsed, 2)
+        self.assertLess(elapsed, 10)
+        # The browser the launcher left behind is killed with its group
+        launcher, browser = self.pids()
+        self.assertTrue(_wait_until_gone(browser))
+
+    def test_failed_launch_gives_up_quickly(self):
+        link, elapsed = self.run_fake("fail", timeout=30)
+        self.assertIsNone(link)
+        self.assertLess(elapsed, 10)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,81 @@
+import os
+import tempfile
+import threading
+import unittest
+import http.client
+from http.server import ThreadingHTTPServer
+
+from utils.playlistIndex import write_index
+from utils.refreshScheduler import RefreshScheduler
+from utils.serve import M3UHandler, PlaylistCache
+from utils.syntheticPlaylist import generate_playlist
+
+
+class SubsetEndpointsTest(unittest.TestCase):
+    def setUp(self):
+        workdir = tempfile.TemporaryDirectory()
+        self.addCleanup(workdir.cleanup)
+        self.m3u_file = os.path.join(workdir.name, "output.m3u")
+        generate_playlist(self.m3u_file, 500)
+        write_index(self.m3u_file)
+
+        playlist_cache = PlaylistCache(self.m3u_file)
+        refresh_scheduler = RefreshScheduler(lambda: True)
+        handler_class = type('QuietHandler', (M3UHandler,), {'log_message': lambda self, *args: None})
+        handler = lambda *args: handler_class(self.m3u_file, *args, playlist_cache=playlist_cache,
+                                              refresh_scheduler=refresh_scheduler)
+        server = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        self.port = server.server_address[1]
+
+    def get(self, path, headers=None):
+        connection = http.client.HTTPConnection('127.0.0.1', self.port, timeout=10)
+        try:
+            connection.request('GET', path, headers=headers or {})
+            response = connection.getresponse()
+            return response.status, dict(response.getheaders()), response.read()
+        finally:
+            connection.close()
+
+    def test_empty_search_is_rejected(self):
+        for path in ('/search', '/search?q=', '/search?q=%20'):
+            status, _, _ = self.get(path)
+            self.assertEqual(status, 400, path)
+
+    def test_search_returns_matching_entries(self):
+        status, _, body = self.get('/search?q=Channel%2042')
+        self.assertEqual(status, 200)
+        self.assertIn(b'Channel 42', body)
+        self.assertLess(body.count(b'#EXTINF'), 20)
+
+    def test_subset_revalidates_with_its_own_etag(self):
+        status, headers, _ = self.get('/group/UK%7C%20NEWS.m3u')
+        self.assertEqual(status, 200)
+        etag = headers['ETag']
+
+        status, headers, body = self.get('/group/UK%7C%20NEWS.m3u', {'If-None-Match': etag})
+        self.assertEqual(status, 304)
+        self.assertEqual(body, b'')
+        self.assertEqual(headers['ETag'], etag)
+
+        # Another subset, or the whole playlist, has a different validator
+        status, other_headers, _ = self.get('/group/US%7C%20NEWS.m3u', {'If-None-Match': etag})
+        self.assertEqual(status, 200)
+        self.assertNotEqual(other_headers['ETag'], etag)
+        status, _, _ = self.get('/', {'If-None-Match': etag})
+        self.assertEqual(status, 200)
+
+    def test_subset_etag_changes_with_the_playlist(self):
+        _, headers, _ = self.get('/group/UK%7C%20NEWS.m3u')
+        generate_playlist(self.m3u_file, 400, seed=1)
+        write_index(self.m3u_file)
+        status, new_headers, _ = self.get('/group/UK%7C%20NEWS.m3u', {'If-None-Match': headers['ETag']})
+        self.assertEqual(status, 200)
+        self.assertNotEqual(new_headers['ETag'], headers['ETag'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,108 @@
+import os
+import re
+import tempfile
+import unittest
+
+import requests
+
+from utils.declutterPlaylist import declutter_playlist
+from utils.providerStandIn import StandInConfig, start_stand_in
+from utils.streamProber import StreamProber
+
+ENTRIES = 40
+DEAD_EVERY = 5
+STREAM_ID_RE = re.compile(r'/(\d+)\.ts$')
+
+
+def read_entries(m3u_filepath):
+    """
+    [(group-title, stream id)] of every entry in a playlist.
+    """
+    with open(m3u_filepath, 'r', encoding='utf-8') as m3u_file:
+        lines = [line.strip() for line in m3u_file if line.strip()]
+    entries = []
+    for extinf, url in zip(lines[1::2], lines[2::2]):
+        group = re.search(r'group-title="([^"]*)"', extinf).group(1)
+        entries.append((group, int(STREAM_ID_RE.search(url).group(1))))
+    return entries
+
+
+class StreamProberTest(unittest.TestCase):
+    """
+    Probes the stand-in provider's streams, every DEAD_EVERY-th of which answers 404.
+    """
+    def setUp(self):
+        self.config = StandInConfig(entries=ENTRIES, dead_every=DEAD_EVERY)
+        server, base_url = start_stand_in(config=self.config)
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+
+        workdir = tempfile.TemporaryDirectory()
+        self.addCleanup(workdir.cleanup)
+        self.workdir = workdir.name
+        self.cache_filepath = os.path.join(self.workdir, "probe_cache.json")
+        self.input_filepath = os.path.join(self.workdir, "input.m3u")
+        response = requests.get(f"{base_url}/get.php?username=user&password=pass", timeout=10)
+        response.raise_for_status()
+        with open(self.input_filepath, 'wb') as input_file:
+            input_file.write(response.content)
+        self.input_entries = read_entries(self.input_filepath)
+
+    def run_prober(self, prober, name="output.m3u"):
+        output_filepath = os.path.join(self.workdir, name)
+        stats = declutter_playlist(self.input_filepath, output_filepath, stages=[], prober=prober)
+        return stats, read_entries(output_filepath)
+
+    def test_drop_mode_removes_dead_streams(self):
+        prober = StreamProber(self.cache_filepath, mode='drop')
+        stats, entries = self.run_prober(prober)
+
+        expected = [entry for entry in self.input_entries if entry[1] % DEAD_EVERY]
+        self.assertEqual(entries, expected)
+        self.assertEqual(stats['entries_out'], len(expected))
+        self.assertEqual(prober.stats, {'probed': ENTRIES, 'cached': 0, 'alive': len(expected),
+                                        'dead': ENTRIES - len(expected)})
+
+    def test_move_mode_regroups_dead_streams(self):
+        prober = StreamProber(self.cache_filepath, mode='move', dead_group='Dead')
+        stats, entries = self.run_prober(prober)
+
+        expected = [('Dead', stream_id) if stream_id % DEAD_EVERY == 0 else (group, stream_id)
+                    for group, stream_id in self.input_entries]
+        self.assertEqual(entries, expected)
+        self.assertEqual(stats['entries_out'], ENTRIES)
+
+    def test_cached_verdicts_skip_repeat_probes(self):
+        self.run_prober(StreamProber(self.cache_filepath), "first.m3u")
+        probes = self.config.stream_requests
+        self.assertGreaterEqual(probes, ENTRIES)
+
+        # A fresh prober reads the verdicts back from disk
+        prober = StreamProber(self.cache_filepath)
+        _, entries = self.run_prober(prober, "second.m3u")
+        self.assertEqual(self.config.stream_requests, probes)
+        self.assertEqual(prober.stats['probed'], 0)
+        self.assertEqual(prober.stats['cached'], ENTRIES)
+        self.assertEqual(len(entries), ENTRIES - ENTRIES // DEAD_EVERY)
+
+    def test_expired_verdicts_are_probed_again(self):
+        self.run_prober(StreamProber(self.cache_filepath), "first.m3u")
+        probes = self.config.stream_requests
+
+        prober = StreamProber(self.cache_filepath, ttl=0, dead_ttl=0)
+        self.run_prober(prober, "second.m3u")
+        self.assertEqual(prober.stats['probed'], ENTRIES)
+        self.assertEqual(self.config.stream_requests, probes * 2)
+
+    def test_per_host_cap_limits_concurrent_probes(self):
+        self.config.stream_delay = 0.05
+        prober = StreamProber(self.cache_filepath, max_workers=16, per_host=3)
+        self.run_prober(prober)
+        self.assertEqual(prober.stats['probed'], ENTRIES)
+        self.assertLessEqual(self.config.max_streams_in_flight, 3)
+        # The cap still lets probes overlap
+        self.assertGreater(self.config.max_streams_in_flight, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
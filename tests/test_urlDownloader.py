@@ -0,0 +1,122 @@
+import io
+import os
+import re
+import socket
+import tempfile
+import threading
+import unittest
+import contextlib
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+from utils.urlDownloader import download_file, parse_content_range
+
+BODY = bytes(range(256)) * 4096 * 4  # 4 MB, so whole 1 MB chunks arrive before the drop
+DROP_AT = 5 * len(BODY) // 8
+RESUME_AT = 2 * 1024 * 1024
+
+
+class FlakyHandler(BaseHTTPRequestHandler):
+    """
+    Drops the first response part-way (or, with 'chunked', after the last byte),
+    then answers Range requests the way 'resume' says.
+    """
+    protocol_version = 'HTTP/1.1'
+    mode = None
+    ranges = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def drop(self):
+        self.wfile.flush()
+        self.connection.shutdown(socket.SHUT_RDWR)
+        self.close_connection = True
+
+    def do_GET(self):
+        range_header = self.headers.get('Range')
+        self.ranges.append(range_header)
+        if range_header is None and len(self.ranges) == 1:
+            self.send_response(200)
+            if self.mode == 'chunked':
+                # Every byte arrives, but the closing zero-length chunk never does
+                self.send_header('Transfer-Encoding', 'chunked')
+                self.end_headers()
+                self.wfile.write(b'%x\r\n' % len(BODY) + BODY + b'\r\n')
+            else:
+                self.send_header('Content-Length', str(len(BODY)))
+                self.end_headers()
+                self.wfile.write(BODY[:DROP_AT])
+            self.drop()
+            return
+
+        start = int(re.match(r'bytes=(\d+)-', range_header).group(1)) if range_header else None
+        if start is not None and start >= len(BODY):
+            self.send_response(416)
+            self.send_header('Content-Range', f'bytes */{len(BODY)}')
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        if start is not None and self.mode == 'wrong_offset':
+            # Answers from the start of the file, whatever was asked for
+            self.send_response(206)
+            self.send_header('Content-Range', f'bytes 0-{len(BODY) - 1}/{len(BODY)}')
+            body = BODY
+        elif start is not None:
+            self.send_response(206)
+            self.send_header('Content-Range', f'bytes {start}-{len(BODY) - 1}/{len(BODY)}')
+            body = BODY[start:]
+        else:
+            self.send_response(200)
+            body = BODY
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class ResumeTest(unittest.TestCase):
+    def download(self, mode):
+        handler = type('Handler', (FlakyHandler,), {'mode': mode, 'ranges': []})
+        server = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+
+        save_directory = tempfile.TemporaryDirectory()
+        self.addCleanup(save_directory.cleanup)
+        stats = {}
+        url = f"http://127.0.0.1:{server.server_address[1]}/playlist.m3u"
+        with contextlib.redirect_stdout(io.StringIO()):
+            path = download_file(url, save_directory.name, stats=stats, show_progress=False)
+        self.assertTrue(path)
+        with open(path, 'rb') as downloaded:
+            self.assertEqual(downloaded.read(), BODY)
+        self.assertFalse(os.path.exists(path + '.part'))
+        return handler.ranges, stats
+
+    def test_resumes_where_it_dropped(self):
+        ranges, stats = self.download('resume')
+        self.assertEqual(ranges, [None, f'bytes={RESUME_AT}-'])
+        self.assertEqual(stats['resumes'], 1)
+
+    def test_part_at_the_wrong_offset_starts_over(self):
+        ranges, _ = self.download('wrong_offset')
+        self.assertEqual(ranges, [None, f'bytes={RESUME_AT}-', None])
+
+    def test_drop_after_the_last_byte_is_complete(self):
+        ranges, stats = self.download('chunked')
+        self.assertEqual(ranges, [None, f'bytes={len(BODY)}-'])
+        self.assertEqual(stats['bytes'], len(BODY))
+
+
+class ParseContentRangeTest(unittest.TestCase):
+    def test_forms(self):
+        self.assertEqual(parse_content_range('bytes 100-199/1000'), (100, 199, 1000))
+        self.assertEqual(parse_content_range('bytes 100-199/*'), (100, 199, None))
+        self.assertEqual(parse_content_range('bytes */1000'), (None, None, 1000))
+        self.assertIsNone(parse_content_range(None))
+        self.assertIsNone(parse_content_range('items 1-2/3'))
+
+
+if __name__ == '__main__':
+    unittest.main()
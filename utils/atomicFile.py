@@ -0,0 +1,39 @@
+import os
+import tempfile
+from contextlib import contextmanager
+
+
+@contextmanager
+def atomic_write(filepath, mode='w', encoding='utf-8', **kwargs):
+    """
+    Opens a temp file next to 'filepath' and renames it into place on success,
+    so readers only ever see the old file or the complete new one.
+    The temp file is removed if the block raises.
+
+    Args:
+        filepath (str): Final path of the file.
+        mode (str): 'w' for text or 'wb' for binary.
+        encoding (str): Text encoding, ignored in binary mode.
+    """
+    directory = os.path.dirname(os.path.abspath(filepath))
+    os.makedirs(directory, exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(dir=directory, prefix=os.path.basename(filepath) + '.', suffix='.tmp')
+    try:
+        if 'b' in mode:
+            file = os.fdopen(fd, mode, **kwargs)
+        else:
+            file = os.fdopen(fd, mode, encoding=encoding, **kwargs)
+        with file:
+            yield file
+        # mkstemp creates the file owner-only; keep the permissions a plain open() would give
+        try:
+            os.chmod(temp_path, os.stat(filepath).st_mode & 0o777)
+        except FileNotFoundError:
+            os.chmod(temp_path, 0o644)
+        os.replace(temp_path, filepath)
+    except BaseException:
+        try:
+            os.remove(temp_path)
+        except OSError:
+            pass
+        raise
@@ -0,0 +1,67 @@
+# python -m utils.benchmarkBlacklist --entries 500000
+import os
+import time
+import argparse
+import tempfile
+
+from utils.declutterPlaylist import declutter_playlist, build_stages, blacklisted_languages
+from utils.syntheticPlaylist import generate_playlist
+
+
+def legacy_group_title_filter(forbidden_substrings):
+    """
+    The original per-entry check: search group-title, then lowercase and scan
+    every blacklisted substring for every entry.
+    """
+    import re
+
+    def stage(entry):
+        group_title_match = re.search(r'group-title="([^"]*)"', entry.extinf, re.IGNORECASE)
+        if group_title_match:
+            group_title_value = group_title_match.group(1)
+            if any(sub.lower() in group_title_value.lower() for sub in forbidden_substrings):
+                return None
+        return entry
+    return stage
+
+
+def time_declutter(input_filepath, output_filepath, stages, repeat):
+    best = None
+    stats = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        stats = declutter_playlist(input_filepath, output_filepath, stages=stages)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the precompiled blacklist matcher against the legacy scan.")
+    parser.add_argument("--entries", type=int, default=500000, help="Synthetic playlist size (default: 500000)")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per variant, best time is reported (default: 3)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        input_filepath = os.path.join(workdir, "input.m3u")
+        generate_playlist(input_filepath, args.entries)
+
+        legacy_output = os.path.join(workdir, "legacy.m3u")
+        legacy_time, legacy_stats = time_declutter(
+            input_filepath, legacy_output, [legacy_group_title_filter(blacklisted_languages)], args.repeat)
+
+        compiled_output = os.path.join(workdir, "compiled.m3u")
+        compiled_time, compiled_stats = time_declutter(
+            input_filepath, compiled_output, build_stages(forbidden_substrings=blacklisted_languages), args.repeat)
+
+        with open(legacy_output, 'rb') as legacy, open(compiled_output, 'rb') as compiled:
+            identical = legacy.read() == compiled.read()
+
+    print(f"Entries: {legacy_stats['entries_in']} in, {legacy_stats['entries_out']} kept")
+    print(f"Legacy scan:       {legacy_time:.3f}s ({args.entries / legacy_time:,.0f} entries/s)")
+    print(f"Compiled matcher:  {compiled_time:.3f}s ({args.entries / compiled_time:,.0f} entries/s)")
+    print(f"Speedup:           {legacy_time / compiled_time:.2f}x")
+    print(f"Identical output:  {identical and legacy_stats == compiled_stats}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+# python -m utils.benchmarkIncremental --entries 500000 --churn 0.01
+import os
+import random
+import time
+import argparse
+import tempfile
+
+from utils.declutterPlaylist import declutter_playlist, build_stages, blacklisted_languages
+from utils.syntheticPlaylist import generate_playlist
+
+
+def churn_playlist(input_filepath, output_filepath, churn, seed=1):
+    """
+    Copies a playlist, renaming a 'churn' fraction of its channels, which is what
+    an upstream refresh mostly looks like.
+
+    Returns:
+        int: Number of entries changed.
+    """
+    rng = random.Random(seed)
+    changed = 0
+    with open(input_filepath, 'r', encoding='utf-8') as infile, \
+         open(output_filepath, 'w', encoding='utf-8') as outfile:
+        for line in infile:
+            if line.startswith("#EXTINF:") and rng.random() < churn:
+                line = line.rstrip("\n") + " (updated)\n"
+                changed += 1
+            outfile.write(line)
+    return changed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark full vs incremental declutter on a playlist with a little churn.")
+    parser.add_argument("--entries", type=int, default=500000, help="Synthetic playlist size (default: 500000)")
+    parser.add_argument("--churn", type=float, default=0.01, help="Fraction of entries changed between runs (default: 0.01)")
+    args = parser.parse_args()
+
+    stages = build_stages("newuser", "newpass", blacklisted_languages)
+
+    with tempfile.TemporaryDirectory() as workdir:
+        previous_input = os.path.join(workdir, "previous.m3u")
+        current_input = os.path.join(workdir, "current.m3u")
+        generate_playlist(previous_input, args.entries)
+        changed = churn_playlist(previous_input, current_input, args.churn)
+
+        full_output = os.path.join(workdir, "full.m3u")
+        start = time.perf_counter()
+        declutter_playlist(current_input, full_output, stages=stages)
+        full_time = time.perf_counter() - start
+
+        incremental_output = os.path.join(workdir, "incremental.m3u")
+        start = time.perf_counter()
+        declutter_playlist(previous_input, incremental_output, stages=stages, incremental=True)
+        seed_time = time.perf_counter() - start
+
+        # The seeding run left its snapshot next to the output, as the previous refresh would
+        start = time.perf_counter()
+        stats = declutter_playlist(current_input, incremental_output, stages=stages, incremental=True)
+        incremental_time = time.perf_counter() - start
+
+        with open(full_output, 'rb') as full, open(incremental_output, 'rb') as incremental:
+            identical = full.read() == incremental.read()
+
+    print(f"Entries: {args.entries}, changed: {changed} ({args.churn:.1%})")
+    print(f"Full rebuild:          {full_time:.3f}s")
+    print(f"Incremental (seeding): {seed_time:.3f}s")
+    print(f"Incremental (churned): {incremental_time:.3f}s, reused {stats['entries_reused']} entries")
+    print(f"Speedup:               {full_time / incremental_time:.2f}x")
+    print(f"Identical output:      {identical}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+# python -m utils.benchmarkLogScan --size-mb 300
+import os
+import re
+import time
+import argparse
+import tempfile
+
+from utils import parsingFromLogs
+from utils.syntheticLogs import generate_log
+
+
+def legacy_extract(filepath):
+    """
+    The original approach: read the whole log into a string and search it from the start.
+    """
+    with open(filepath, 'r') as file:
+        content = file.read()
+    match = re.search(r'\[echo\] m3uLink = (http[^\s]+)', content)
+    return match.group(1) if match else None
+
+
+def timed(function, *args):
+    start = time.perf_counter()
+    result = function(*args)
+    return time.perf_counter() - start, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the backwards log scanner against a whole-file read.")
+    parser.add_argument("--size-mb", type=float, default=300, help="Synthetic log size in MB (default: 300)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        for index in range(20):
+            # Older logs the scanner has to look past
+            open(os.path.join(workdir, f"iptvlogs ({index}).txt"), 'w').close()
+        log_filepath = os.path.join(workdir, "iptvlogs.txt")
+        newest_link = generate_log(log_filepath, args.size_mb)
+
+        legacy_time, legacy_link = timed(legacy_extract, log_filepath)
+        find_time, newest = timed(parsingFromLogs.find_newest_file, workdir, parsingFromLogs.LOG_PATTERN)
+        scan_time, scanned_link = timed(parsingFromLogs.extract_m3u_link_from_log, newest)
+        cached_time, _ = timed(parsingFromLogs.extract_m3u_link_from_log, newest)
+
+    print(f"Log size:            {args.size_mb:.0f} MB")
+    print(f"Whole-file read:     {legacy_time:.3f}s (found the {'newest' if legacy_link == newest_link else 'OLDEST'} link)")
+    print(f"Newest-file scan:    {find_time * 1000:.2f} ms")
+    print(f"Backwards scan:      {scan_time * 1000:.2f} ms (found the {'newest' if scanned_link == newest_link else 'WRONG'} link)")
+    print(f"Cached lookup:       {cached_time * 1000:.3f} ms")
+    print(f"Speedup:             {legacy_time / scan_time:.0f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,414 @@
+# python -m utils.benchmarkSuite --sizes 10k,100k --save-baseline benchmarks/baseline.json
+# python -m utils.benchmarkSuite --sizes 10k,100k --baseline benchmarks/baseline.json
+# python -m utils.benchmarkSuite --sizes 10k --self-check
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import tempfile
+import subprocess
+import threading
+from http.server import ThreadingHTTPServer
+
+from utils.metrics import peak_rss_bytes
+from utils.syntheticPlaylist import generate_playlist
+from utils.syntheticLogs import generate_log
+from utils.syntheticEpg import generate_epg
+
+DEFAULT_SIZES = "10k,100k"
+DEFAULT_THRESHOLD = 0.25
+DEFAULT_REPEAT = 5
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Which way is better for each metric; anything else is reported but never compared
+METRIC_DIRECTIONS = {
+    'seconds': 'lower',
+    'entries_per_sec': 'higher',
+    'mb_per_sec': 'higher',
+    'requests_per_sec': 'higher',
+    'p50_ms': 'lower',
+    'p99_ms': 'lower',
+    'peak_rss_mb': 'lower',
+}
+
+# Differences smaller than these are timer noise, whatever the percentage
+NOISE_FLOORS = {'seconds': 0.01, 'p50_ms': 2.0, 'p99_ms': 5.0, 'peak_rss_mb': 2.0}
+
+# Timed benchmarks run at least --repeat times and until they've taken this long,
+# so a 40 ms benchmark gets enough runs for its best to be stable
+MIN_TIMED_SECONDS = 1.0
+MAX_TIMED_RUNS = 100
+# A metric only regresses past this many times the spread seen between its runs
+SPREAD_FACTOR = 3.0
+# Load tests are split into rounds, whose spread is what the gate allows for
+SERVE_ROUNDS = 3
+# A few dozen slow requests make p99, so it's only gated on long load tests
+P99_MIN_DURATION = 30.0
+# Flagged benchmarks are run again up to this many times, keeping their best, so a
+# burst of load elsewhere on the machine doesn't fail the gate
+CONFIRM_RUNS = 2
+# Every load test round opens all its connections at once; the default backlog of 5
+# drops some of them, which then wait a whole second to retry
+SERVE_BACKLOG = 64
+
+# Fixed sizes for the benchmarks that don't scale with --sizes
+SERVE_ENTRIES = 10000
+DOWNLOAD_ENTRIES = 100000
+
+
+def parse_size(label):
+    # '10k' -> 10000, '1m' -> 1000000
+    label = label.strip().lower()
+    multiplier = {'k': 1000, 'm': 1000000}.get(label[-1:], 1)
+    return int(float(label.rstrip('km')) * multiplier)
+
+
+def _timed(repeat, function):
+    """
+    Times 'function' at least 'repeat' times, and until MIN_TIMED_SECONDS have
+    gone by. Returns (best time, spread), the spread being how far the median
+    run was from the best, as a fraction of the best.
+    """
+    times = []
+    started = time.perf_counter()
+    while len(times) < MAX_TIMED_RUNS and (len(times) < repeat or time.perf_counter() - started < MIN_TIMED_SECONDS):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    times.sort()
+    best = times[0]
+    return best, (times[len(times) // 2] - best) / best if best else 0.0
+
+
+def _with_spread(metrics, spread):
+    # Rates are derived from the same timings, so they share their spread
+    return metrics, {metric: spread for metric in metrics}
+
+
+def _quietly(function, *args, **kwargs):
+    # The pipeline reports progress with print(); keep it out of the benchmark output
+    stdout = sys.stdout
+    with open(os.devnull, 'w') as devnull:
+        sys.stdout = devnull
+        try:
+            return function(*args, **kwargs)
+        finally:
+            sys.stdout = stdout
+
+
+def playlist_path(workdir, entries):
+    return os.path.join(workdir, f"playlist-{entries}.m3u")
+
+
+def prepare(workdir, sizes):
+    """
+    Writes the synthetic inputs every benchmark reads, once per suite run.
+    """
+    for entries in sorted(set(sizes) | {SERVE_ENTRIES, DOWNLOAD_ENTRIES}):
+        generate_playlist(playlist_path(workdir, entries), entries)
+    os.makedirs(os.path.join(workdir, "logs"), exist_ok=True)
+    for index in range(20):
+        open(os.path.join(workdir, "logs", f"iptvlogs ({index}).txt"), 'w').close()
+    generate_log(os.path.join(workdir, "logs", "iptvlogs.txt"), 100)
+    generate_epg(os.path.join(workdir, "epg.xml"), playlist_path(workdir, SERVE_ENTRIES), 24)
+
+
+def bench_declutter(workdir, entries, repeat):
+    from utils.declutterPlaylist import declutter_playlist
+    input_filepath = playlist_path(workdir, entries)
+    output_filepath = os.path.join(workdir, f"declutter-{entries}.m3u")
+    seconds, spread = _timed(repeat, lambda: _quietly(declutter_playlist, input_filepath, output_filepath))
+    return _with_spread({
+        'seconds': seconds,
+        'entries_per_sec': entries / seconds,
+        'mb_per_sec': os.path.getsize(input_filepath) / (1024 * 1024) / seconds,
+    }, spread)
+
+
+def bench_index(workdir, entries, repeat):
+    from utils.playlistIndex import write_index
+    input_filepath = playlist_path(workdir, entries)
+    seconds, spread = _timed(repeat, lambda: write_index(input_filepath, os.path.join(workdir, f"index-{entries}.idx")))
+    return _with_spread({'seconds': seconds, 'entries_per_sec': entries / seconds}, spread)
+
+
+def bench_log_scan(workdir, repeat):
+    from utils import parsingFromLogs
+    logs_folder = os.path.join(workdir, "logs")
+
+    def scan():
+        newest = parsingFromLogs.find_newest_file(logs_folder, parsingFromLogs.LOG_PATTERN)
+        parsingFromLogs.find_last_match(newest, parsingFromLogs.M3U_LINK_RE)
+    seconds, spread = _timed(repeat, scan)
+    return _with_spread({'seconds': seconds}, spread)
+
+
+def bench_download(workdir, repeat):
+    from utils.providerStandIn import StandInConfig, start_stand_in
+    from utils.urlDownloader import download_file
+    with open(playlist_path(workdir, DOWNLOAD_ENTRIES), 'rb') as playlist_file:
+        body = playlist_file.read()
+    server, base_url = start_stand_in(config=StandInConfig(playlist=body))
+    try:
+        url = f"{base_url}/get.php?username=user&password=pass"
+        seconds, spread = _timed(repeat, lambda: _quietly(
+            download_file, url, os.path.join(workdir, "downloads"), overwrite=True, show_progress=False))
+    finally:
+        server.shutdown()
+    return _with_spread({'seconds': seconds, 'mb_per_sec': len(body) / (1024 * 1024) / seconds}, spread)
+
+
+def bench_serve(workdir, duration, gzip_encoding=False):
+    from utils.loadTest import run_load_test
+    from utils.refreshScheduler import RefreshScheduler
+    from utils.serve import M3UHandler, PlaylistCache
+    m3u_file = playlist_path(workdir, SERVE_ENTRIES)
+    playlist_cache = PlaylistCache(m3u_file)
+    refresh_scheduler = RefreshScheduler(lambda: True)
+    handler_class = type('QuietHandler', (M3UHandler,), {'log_message': lambda self, *args: None})
+    handler = lambda *args: handler_class(m3u_file, *args, playlist_cache=playlist_cache,
+                                          refresh_scheduler=refresh_scheduler)
+    server_class = type('BenchServer', (ThreadingHTTPServer,), {'request_queue_size': SERVE_BACKLOG})
+    server = server_class(('127.0.0.1', 0), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        headers = {'Accept-Encoding': 'gzip'} if gzip_encoding else {}
+        url = f"http://127.0.0.1:{server.server_address[1]}/"
+        run_load_test(url, concurrency=4, duration=min(1.0, duration), headers=headers)  # warm the cache
+        rounds = [run_load_test(url, concurrency=16, duration=duration / SERVE_ROUNDS, headers=headers)
+                  for _ in range(SERVE_ROUNDS)]
+    finally:
+        server.shutdown()
+        server.server_close()
+    metrics, spreads = {}, {}
+    for key in ('requests_per_sec', 'p50_ms', 'p99_ms'):
+        values = sorted(result[key] for result in rounds)
+        median = values[len(values) // 2]
+        metrics[key] = median
+        spreads[key] = (values[-1] - values[0]) / median if median else 0.0
+    return metrics, spreads
+
+
+def bench_epg(workdir, repeat):
+    from utils.epgSubset import trim_epg
+    from utils.playlistIndex import PlaylistIndex
+    with open(playlist_path(workdir, SERVE_ENTRIES), 'rb') as playlist_file:
+        tvg_ids = list(PlaylistIndex.build(playlist_file).tvg_ranges)
+    # Keep a fifth of the channels, like a typical blacklist would
+    tvg_ids = set(tvg_ids[::5])
+    source_filepath = os.path.join(workdir, "epg.xml")
+    stats = {}
+    seconds, spread = _timed(repeat, lambda: trim_epg(source_filepath, os.path.join(workdir, "epg.xml.gz"), tvg_ids, stats))
+    return _with_spread({
+        'seconds': seconds,
+        'entries_per_sec': stats['programmes_in'] / seconds,
+        'mb_per_sec': os.path.getsize(source_filepath) / (1024 * 1024) / seconds,
+    }, spread)
+
+
+def benchmark_names(sizes):
+    names = []
+    for entries in sizes:
+        names += [f"declutter-{entries}", f"index-{entries}"]
+    return names + ["log-scan", "download", "serve", "serve-gzip", "epg"]
+
+
+def run_one(name, workdir, repeat, duration):
+    """
+    Runs one benchmark in this process. Meant to be called in a fresh child
+    process, so the peak RSS it reports is this benchmark's alone.
+
+    Returns:
+        dict: {'metrics': {metric: value}, 'spreads': {metric: fraction}}
+    """
+    kind, _, entries = name.partition('-')
+    if kind == 'declutter':
+        metrics, spreads = bench_declutter(workdir, int(entries), repeat)
+    elif kind == 'index':
+        metrics, spreads = bench_index(workdir, int(entries), repeat)
+    elif name == 'log-scan':
+        metrics, spreads = bench_log_scan(workdir, repeat)
+    elif name == 'download':
+        metrics, spreads = bench_download(workdir, repeat)
+    elif name == 'serve':
+        metrics, spreads = bench_serve(workdir, duration)
+    elif name == 'serve-gzip':
+        metrics, spreads = bench_serve(workdir, duration, gzip_encoding=True)
+    elif name == 'epg':
+        metrics, spreads = bench_epg(workdir, repeat)
+    else:
+        raise ValueError(f"Unknown benchmark '{name}'")
+
+    peak_rss = peak_rss_bytes()
+    if peak_rss is not None:
+        metrics['peak_rss_mb'] = peak_rss / (1024 * 1024)
+    return {'metrics': metrics, 'spreads': spreads}
+
+
+def run_suite(sizes, repeat=DEFAULT_REPEAT, duration=5.0, workdir=None, names=None):
+    """
+    Prepares the inputs, then runs every benchmark (or just 'names') in its own
+    child process.
+
+    Returns:
+        dict: {'machine': ..., 'settings': ..., 'results': {benchmark: {metric: value}},
+               'spreads': {benchmark: {metric: fraction}}}
+    """
+    with tempfile.TemporaryDirectory(dir=workdir) as workdir:
+        print("Preparing synthetic inputs...")
+        prepare(workdir, sizes)
+        results, spreads = {}, {}
+        for name in names or benchmark_names(sizes):
+            result_filepath = os.path.join(workdir, f"{name}.json")
+            subprocess.run([sys.executable, '-m', 'utils.benchmarkSuite', '--run-one', name, '--workdir', workdir,
+                            '--repeat', str(repeat), '--duration', str(duration), '--result-file', result_filepath],
+                           check=True, cwd=REPO_ROOT)
+            with open(result_filepath, 'r', encoding='utf-8') as result_file:
+                result = json.load(result_file)
+            results[name], spreads[name] = result['metrics'], result['spreads']
+            print(f"{name:<18} " + "  ".join(f"{metric}={value:,.2f}" for metric, value in results[name].items()))
+
+    return {
+        'machine': {'python': platform.python_version(), 'platform': platform.platform(),
+                    'processor': platform.processor() or platform.machine(), 'cpus': os.cpu_count()},
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'settings': {'repeat': repeat, 'duration': duration},
+        'results': results,
+        'spreads': spreads,
+    }
+
+
+def gated_metrics(current, baseline):
+    """
+    The metrics compare() checks. p99 is left out unless both runs' load tests
+    were long enough for it to be more than a handful of requests.
+    """
+    metrics = set(METRIC_DIRECTIONS)
+    durations = [report.get('settings', {}).get('duration', 0.0) for report in (current, baseline)]
+    if min(durations) < P99_MIN_DURATION:
+        metrics.discard('p99_ms')
+    return metrics
+
+
+def compare(current, baseline, threshold=DEFAULT_THRESHOLD):
+    """
+    Lists the metrics that got worse than the baseline as (benchmark, metric,
+    baseline value, current value) tuples.
+
+    A metric has to be worse by more than 'threshold' (a fraction), by more
+    than SPREAD_FACTOR times the spread either run saw between its repeats,
+    and by more than its noise floor.
+    """
+    regressions = []
+    gated = gated_metrics(current, baseline)
+    for name, metrics in current['results'].items():
+        for metric, value in metrics.items():
+            previous = baseline['results'].get(name, {}).get(metric)
+            direction = METRIC_DIRECTIONS.get(metric)
+            if previous is None or direction is None or metric not in gated or previous <= 0:
+                continue
+            if abs(value - previous) < NOISE_FLOORS.get(metric, 0.0):
+                continue
+            spread = max(report.get('spreads', {}).get(name, {}).get(metric, 0.0) for report in (current, baseline))
+            allowed = max(threshold, SPREAD_FACTOR * spread)
+            change = (value - previous) / previous
+            if (direction == 'lower' and change > allowed) or (direction == 'higher' and change < -allowed):
+                regressions.append((name, metric, previous, value))
+    return regressions
+
+
+def keep_best(report, rerun):
+    """
+    Folds a rerun into 'report', keeping each metric's better value and the
+    larger spread.
+    """
+    for name, metrics in rerun['results'].items():
+        results = report['results'].setdefault(name, {})
+        spreads = report['spreads'].setdefault(name, {})
+        for metric, value in metrics.items():
+            previous = results.get(metric)
+            direction = METRIC_DIRECTIONS.get(metric)
+            if previous is None or (direction == 'lower' and value < previous) or (direction == 'higher' and value > previous):
+                results[metric] = value
+            spreads[metric] = max(spreads.get(metric, 0.0), rerun['spreads'].get(name, {}).get(metric, 0.0))
+    return report
+
+
+def confirmed_regressions(report, baseline, threshold, sizes, repeat, duration, workdir=None):
+    """
+    Compares 'report' to 'baseline', re-running the flagged benchmarks up to
+    CONFIRM_RUNS times; only what stays worse across every run is returned.
+    """
+    regressions = compare(report, baseline, threshold)
+    for _ in range(CONFIRM_RUNS):
+        if not regressions:
+            break
+        names = sorted({name for name, _, _, _ in regressions})
+        print(f"Re-running {', '.join(names)} to confirm")
+        keep_best(report, run_suite(sizes, repeat, duration, workdir, names=names))
+        regressions = compare(report, baseline, threshold)
+    return regressions
+
+
+def report_regressions(regressions):
+    for name, metric, previous, value in regressions:
+        print(f"REGRESSION {name} {metric}: {previous:,.2f} -> {value:,.2f}")
+    if not regressions:
+        print("No regressions beyond the threshold and the measured spread")
+    return bool(regressions)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the pipeline and server, and check for regressions.")
+    parser.add_argument("--sizes", default=DEFAULT_SIZES, help=f"Playlist sizes, e.g. 10k,100k,1m (default: {DEFAULT_SIZES})")
+    parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT,
+                        help=f"Least runs per timed benchmark, best is kept; short ones run for at least "
+                             f"{MIN_TIMED_SECONDS:g}s (default: {DEFAULT_REPEAT})")
+    parser.add_argument("--duration", type=float, default=5.0, help="Seconds per server load test (default: 5)")
+    parser.add_argument("--output", default=None, help="Also write this run's results to a JSON file")
+    parser.add_argument("--save-baseline", default=None, help="Write this run's results as the new baseline")
+    parser.add_argument("--baseline", default=None, help="Baseline to compare against; exits 1 on a regression")
+    parser.add_argument("--self-check", action="store_true",
+                        help="Run the suite twice and compare the runs; exits 1 if the same tree reports a regression")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help=f"Allowed slowdown before failing, as a fraction (default: {DEFAULT_THRESHOLD})")
+    parser.add_argument("--workdir", default=None, help=argparse.SUPPRESS)
+    parser.add_argument("--run-one", default=None, help=argparse.SUPPRESS)
+    parser.add_argument("--result-file", default=None, help=argparse.SUPPRESS)
+
+    args = parser.parse_args()
+
+    if args.run_one:
+        result = run_one(args.run_one, args.workdir, args.repeat, args.duration)
+        with open(args.result_file, 'w', encoding='utf-8') as result_file:
+            json.dump(result, result_file)
+        return
+
+    sizes = [parse_size(label) for label in args.sizes.split(',') if label.strip()]
+    if args.self_check:
+        first = run_suite(sizes, args.repeat, args.duration, args.workdir)
+        second = run_suite(sizes, args.repeat, args.duration, args.workdir)
+        regressions = confirmed_regressions(second, first, args.threshold, sizes, args.repeat, args.duration, args.workdir)
+        sys.exit(1 if report_regressions(regressions) else 0)
+    report = run_suite(sizes, args.repeat, args.duration, args.workdir)
+
+    for output in (args.output, args.save_baseline):
+        if output:
+            os.makedirs(os.path.dirname(output) or '.', exist_ok=True)
+            with open(output, 'w', encoding='utf-8') as output_file:
+                json.dump(report, output_file, indent=2)
+            print(f"Results written to '{output}'")
+
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as baseline_file:
+            baseline = json.load(baseline_file)
+        regressions = confirmed_regressions(report, baseline, args.threshold, sizes, args.repeat, args.duration, args.workdir)
+        if report_regressions(regressions):
+            sys.exit(1)
+        print(f"Compared against '{args.baseline}'")
+
+if __name__ == "__main__":
+    main()
@@ -1,115 +1,528 @@
 # python .\freeiptv.ottc.xyz.py .\tv_channels_098768842155_plus.m3u output.m3u 098768842155 975226199472s
+import io
 import re
+import os
+import json
+import zlib
+import struct
 import argparse
+import itertools
+import hashlib
+from array import array
+
+from utils.atomicFile import atomic_write
+from utils.playlistIndex import write_index
+from utils.urlRewriter import url_rewriter
 
 blacklisted_languages = ["FR", "DE", "IR", "BN", "AR", "TN", "TL", "KL", "GR", "NL", "ML", "EX", "PL", "LA", "SE", "KANNADA", "TELUGU", "TELEGU", "ES", "IT", "PT", "JP"]
 
-def declutter_playlist(input_filepath, output_filepath, url_part1=None, url_part2=None):
+# Optional config file overriding blacklisted_languages, see load_blacklist()
+DEFAULT_BLACKLIST_FILE = "blacklist.txt"
+
+# Regex to find group-title="...", case insensitive for "group-title" attribute name
+GROUP_TITLE_RE = re.compile(r'group-title="([^"]*)"', re.IGNORECASE)
+TVG_ID_RE = re.compile(r'tvg-id="([^"]*)"', re.IGNORECASE)
+
+# Incremental runs keep a snapshot of the output's chunks next to it, see DeclutterSnapshot
+SNAPSHOT_SUFFIX = ".snapshot"
+SNAPSHOT_MAGIC = b"M3USNAP1\n"
+# A chunk ends after a stream URL line whose hash has its top CHUNK_BITS clear: 8 entries on average
+CHUNK_BITS = 3
+COPY_SIZE = 1024 * 1024
+
+
+class PlaylistEntry:
+    """
+    One channel record: the #EXTINF line, any directive lines that sit between
+    it and the stream URL (#EXTVLCOPT, #EXTGRP, ...), and the URL line itself.
+    All lines are kept raw, including their line endings.
+    """
+    __slots__ = ('extinf', 'options', 'url')
+
+    def __init__(self, extinf, options=None, url=None):
+        self.extinf = extinf
+        self.options = options if options is not None else []
+        self.url = url
+
+    @property
+    def group_title(self):
+        match = GROUP_TITLE_RE.search(self.extinf)
+        return match.group(1) if match else None
+
+    @property
+    def tvg_id(self):
+        match = TVG_ID_RE.search(self.extinf)
+        return match.group(1) if match else None
+
+    def text(self):
+        return "".join(self.lines())
+
+    def lines(self):
+        yield self.extinf
+        yield from self.options
+        yield self.url
+
+
+def parse_playlist(lines):
+    """
+    Lazily groups M3U lines into entries, holding at most one entry in memory.
+
+    Args:
+        lines (iterable of str): Raw lines including line endings, e.g. an open file.
+
+    Yields:
+        PlaylistEntry for every complete #EXTINF record, or the raw line (str)
+        for non-empty lines outside a record (comments, other directives).
+        Empty lines are dropped, and an #EXTINF without a URL is discarded.
+    """
+    pending = None
+    for line_raw in lines:
+        line_stripped = line_raw.strip()
+        if not line_stripped:
+            continue
+
+        if line_stripped.startswith("#EXTINF:"):
+            # A new tag before the previous one got its URL: the previous entry is incomplete
+            pending = PlaylistEntry(line_raw)
+        elif pending is not None:
+            if line_stripped.startswith("#"):
+                pending.options.append(line_raw)
+            else:
+                pending.url = line_raw
+                yield pending
+                pending = None
+        else:
+            yield line_raw
+
+
+class BlacklistMatcher:
+    """
+    Case-insensitive substring matcher for group-titles.
+
+    All forbidden substrings are compiled into one alternation regex up front,
+    and verdicts are memoized per distinct group-title, since a playlist only
+    has a few hundred distinct groups.
+    """
+    __slots__ = ('substrings', '_pattern', '_memo')
+
+    # Safety valve for pathological inputs with unbounded distinct groups
+    MAX_MEMO_SIZE = 65536
+
+    def __init__(self, forbidden_substrings):
+        self.substrings = tuple(sub for sub in forbidden_substrings if sub)
+        if self.substrings:
+            # Longest first so the alternation never stops on a shorter prefix
+            alternatives = sorted(set(self.substrings), key=len, reverse=True)
+            self._pattern = re.compile("|".join(re.escape(sub) for sub in alternatives), re.IGNORECASE)
+        else:
+            self._pattern = None
+        self._memo = {}
+
+    def is_blacklisted(self, group_title_value):
+        try:
+            return self._memo[group_title_value]
+        except KeyError:
+            pass
+        blocked = self._pattern is not None and self._pattern.search(group_title_value) is not None
+        if len(self._memo) >= self.MAX_MEMO_SIZE:
+            self._memo.clear()
+        self._memo[group_title_value] = blocked
+        return blocked
+
+
+def load_blacklist(config_path=DEFAULT_BLACKLIST_FILE):
+    """
+    Loads the forbidden group-title substrings from a config file.
+
+    Args:
+        config_path (str): Either a .json file holding a list of strings, or a
+                           plain text file with one substring per line
+                           ('#' starts a comment).
+
+    Returns:
+        list: The substrings, or the built-in blacklisted_languages if the
+              file does not exist.
+    """
+    if not config_path or not os.path.exists(config_path):
+        return list(blacklisted_languages)
+
+    with open(config_path, 'r', encoding='utf-8') as config_file:
+        if config_path.lower().endswith('.json'):
+            return [str(sub) for sub in json.load(config_file)]
+        substrings = []
+        for line in config_file:
+            line = line.split('#', 1)[0].strip()
+            if line:
+                substrings.append(line)
+        return substrings
+
+
+def group_title_filter(forbidden_substrings):
+    """
+    Builds a stage that drops entries whose 'group-title' contains any of the
+    given substrings (case-insensitive). Entries without a group-title are kept.
+
+    Args:
+        forbidden_substrings (list or BlacklistMatcher): Substrings to reject.
+    """
+    matcher = forbidden_substrings
+    if not isinstance(matcher, BlacklistMatcher):
+        matcher = BlacklistMatcher(forbidden_substrings)
+
+    def stage(entry):
+        group_title_value = entry.group_title
+        if group_title_value is not None and matcher.is_blacklisted(group_title_value):
+            return None
+        return entry
+    # Stages with a key are pure functions of it, which lets incremental runs reuse their results
+    stage.key = ('group_title_filter', matcher.substrings)
+    return stage
+
+
+def build_stages(url_part1=None, url_part2=None, forbidden_substrings=None):
+    """
+    Returns the default filter/rewrite chain used by declutter_playlist.
+    """
+    if forbidden_substrings is None:
+        forbidden_substrings = load_blacklist()
+    stages = [group_title_filter(forbidden_substrings)]
+    if url_part1 and url_part2:
+        stages.append(url_rewriter(url_part1, url_part2))
+    return stages
+
+
+def apply_stages(items, stages, stats=None):
+    """
+    Runs every PlaylistEntry through the stages in order; a stage returning
+    None drops the entry. Raw lines pass through untouched.
+    """
+    for item in items:
+        if isinstance(item, PlaylistEntry):
+            if stats is not None:
+                stats['entries_in'] += 1
+            for stage in stages:
+                item = stage(item)
+                if item is None:
+                    break
+            if item is None:
+                continue
+            if stats is not None:
+                stats['entries_out'] += 1
+        yield item
+
+
+def stages_key(stages):
+    """
+    Returns a value identifying the whole chain, or None if any stage lacks a key.
+    """
+    keys = tuple(getattr(stage, 'key', None) for stage in stages)
+    return None if None in keys else keys
+
+
+def split_chunks(lines):
+    """
+    Groups raw byte lines into chunks of a few entries, ending a chunk after a
+    stream URL line picked by a hash of its bytes. The boundaries depend only on nearby
+    content, so a channel added or removed upstream changes the chunk around it
+    and leaves the others byte for byte the same. A chunk never ends inside an
+    entry, so each one parses the same on its own as within the whole file.
+    """
+    crc32 = zlib.crc32
+    shift = 32 - CHUNK_BITS
+    chunk = []
+    append = chunk.append
+    for line in lines:
+        append(line)
+        # 35 is '#': only a URL line (or stray text) resets the parser. CRC-32 alone
+        # is linear, so URLs differing in a digit or two share their low bits;
+        # Fibonacci hashing spreads them before the top bits are taken.
+        if line[0] != 35 and not ((crc32(line) * 0x9E3779B1) & 0xFFFFFFFF) >> shift:
+            stripped = line.strip()
+            if stripped and stripped[0] != 35:
+                yield b"".join(chunk)
+                chunk.clear()
+    if chunk:
+        yield b"".join(chunk)
+
+
+def _encode_output(text):
+    # The bytes a text-mode write would put on disk, as the full declutter writes
+    if os.linesep != '\n':
+        text = text.replace('\n', os.linesep)
+    return text.encode('utf-8')
+
+
+def render_chunk(data, stages, stats, first=False):
+    """
+    Runs one chunk of raw playlist bytes through the stages, the same way the
+    full declutter reads and writes them, and returns the output bytes. The
+    first chunk also gets the '#EXTM3U' header handling.
+    """
+    text = data.decode('utf-8')
+    if '\r' in text:
+        # What reading the file in text mode does
+        text = text.replace('\r\n', '\n').replace('\r', '\n')
+    lines = io.StringIO(text)
+    output = []
+    if first:
+        first_line = next(lines, '')
+        if first_line.strip().upper() == "#EXTM3U":
+            output.append(first_line)
+        else:
+            output.append("#EXTM3U\n")
+            lines = itertools.chain([first_line], lines)
+    for item in apply_stages(parse_playlist(lines), stages, stats):
+        output.append(item.text() if isinstance(item, PlaylistEntry) else item)
+    return _encode_output("".join(output))
+
+
+class DeclutterSnapshot:
+    """
+    What an incremental declutter wrote: for every input chunk, a digest of its
+    bytes, where its output sits in the output playlist, and its entry counts.
+    It is only trusted while the output file is the one it describes (same size
+    and mtime) and the stages are the same.
+    """
+    __slots__ = ('stages_digest', 'output_size', 'output_mtime_ns', 'digests', 'spans', 'counts')
+
+    DIGEST_SIZE = 16
+
+    def __init__(self, stages_digest, output_size=0, output_mtime_ns=0, digests=None, spans=None, counts=None):
+        self.stages_digest = stages_digest
+        self.output_size = output_size
+        self.output_mtime_ns = output_mtime_ns
+        self.digests = digests if digests is not None else bytearray()   # DIGEST_SIZE bytes per chunk
+        self.spans = spans if spans is not None else array('Q')          # output start, end per chunk
+        self.counts = counts if counts is not None else array('I')       # entries in, out per chunk
+
+    def __len__(self):
+        return len(self.spans) // 2
+
+    @staticmethod
+    def chunk_digest(data, first):
+        hasher = hashlib.sha256()
+        if first:
+            # The first chunk renders differently (header handling), so it only matches itself
+            hasher.update(b"first\n")
+        hasher.update(data)
+        return hasher.digest()[:DeclutterSnapshot.DIGEST_SIZE]
+
+    def add(self, digest, start, end, entries_in, entries_out):
+        self.digests += digest
+        self.spans.extend((start, end))
+        self.counts.extend((entries_in, entries_out))
+
+    def lookup(self):
+        """
+        {chunk digest: chunk number}, for finding a chunk from the previous run.
+        """
+        size = self.DIGEST_SIZE
+        digests = bytes(self.digests)
+        return {digests[position * size:(position + 1) * size]: position for position in range(len(self))}
+
+    def describes(self, output_stat, stages_digest):
+        return (self.stages_digest == stages_digest and self.output_size == output_stat.st_size
+                and self.output_mtime_ns == output_stat.st_mtime_ns)
+
+    def save(self, snapshot_filepath):
+        """
+        Writes the snapshot as: magic, a length-prefixed JSON header, then the
+        raw digest, span and count arrays.
+        """
+        header = json.dumps({
+            'stages_digest': self.stages_digest,
+            'output_size': self.output_size,
+            'output_mtime_ns': self.output_mtime_ns,
+            'chunks': len(self),
+        }).encode('utf-8')
+
+        with atomic_write(snapshot_filepath, 'wb') as snapshot_file:
+            snapshot_file.write(SNAPSHOT_MAGIC)
+            snapshot_file.write(struct.pack('<Q', len(header)))
+            snapshot_file.write(header)
+            snapshot_file.write(self.digests)
+            self.spans.tofile(snapshot_file)
+            self.counts.tofile(snapshot_file)
+
+    @classmethod
+    def load(cls, snapshot_filepath):
+        with open(snapshot_filepath, 'rb') as snapshot_file:
+            if snapshot_file.read(len(SNAPSHOT_MAGIC)) != SNAPSHOT_MAGIC:
+                raise ValueError(f"'{snapshot_filepath}' is not a declutter snapshot")
+            header_length, = struct.unpack('<Q', snapshot_file.read(8))
+            header = json.loads(snapshot_file.read(header_length).decode('utf-8'))
+
+            chunks = header['chunks']
+            digests = bytearray(snapshot_file.read(chunks * cls.DIGEST_SIZE))
+            if len(digests) != chunks * cls.DIGEST_SIZE:
+                raise EOFError(f"'{snapshot_filepath}' is truncated")
+            spans = array('Q')
+            spans.fromfile(snapshot_file, chunks * 2)
+            counts = array('I')
+            counts.fromfile(snapshot_file, chunks * 2)
+
+        return cls(header['stages_digest'], header['output_size'], header['output_mtime_ns'], digests, spans, counts)
+
+
+def _copy_range(source, destination, start, end):
+    source.seek(start)
+    remaining = end - start
+    while remaining > 0:
+        data = source.read(min(COPY_SIZE, remaining))
+        if not data:
+            raise EOFError("previous output is shorter than its snapshot")
+        destination.write(data)
+        remaining -= len(data)
+
+
+def _open_previous_output(output_filepath, stages_digest):
+    """
+    Returns (previous output file opened for reading, its snapshot), or (None, None)
+    if there is no snapshot that still describes the output.
+    """
+    try:
+        previous_file = open(output_filepath, 'rb')
+    except FileNotFoundError:
+        return None, None
+    try:
+        snapshot = DeclutterSnapshot.load(output_filepath + SNAPSHOT_SUFFIX)
+        if snapshot.describes(os.fstat(previous_file.fileno()), stages_digest):
+            return previous_file, snapshot
+    except (OSError, ValueError, EOFError, KeyError):
+        pass
+    previous_file.close()
+    return None, None
+
+
+def declutter_incremental(input_filepath, output_filepath, stages, key, stats):
+    """
+    Diffs the input against the snapshot of the previous run into this output
+    and splices: chunks whose bytes are unchanged are copied from the previous
+    output without being parsed, and only new or changed chunks go through the
+    stages. The new snapshot is saved next to the output, so the next run, in
+    this process or another, can do the same.
+    """
+    stages_digest = hashlib.blake2b(repr(key).encode('utf-8'), digest_size=16).hexdigest()
+    previous_file, previous = _open_previous_output(output_filepath, stages_digest)
+    lookup = previous.lookup() if previous is not None else {}
+    current = DeclutterSnapshot(stages_digest)
+
+    try:
+        with open(input_filepath, 'rb') as infile, atomic_write(output_filepath, 'wb') as outfile:
+            offset = 0
+            # Reused chunks that sit back to back in the previous output are copied in one go
+            run_start = run_end = None
+            for position, data in enumerate(split_chunks(infile)):
+                digest = DeclutterSnapshot.chunk_digest(data, position == 0)
+                found = lookup.get(digest)
+                if found is not None:
+                    old_start, old_end = previous.spans[2 * found], previous.spans[2 * found + 1]
+                    entries_in, entries_out = previous.counts[2 * found], previous.counts[2 * found + 1]
+                    if old_start != run_end:
+                        if run_start is not None:
+                            _copy_range(previous_file, outfile, run_start, run_end)
+                        run_start = old_start
+                    run_end = old_end
+                    length = old_end - old_start
+                    stats['entries_reused'] += entries_in
+                else:
+                    if run_start is not None:
+                        _copy_range(previous_file, outfile, run_start, run_end)
+                        run_start = run_end = None
+                    chunk_stats = {'entries_in': 0, 'entries_out': 0}
+                    rendered = render_chunk(data, stages, chunk_stats, first=position == 0)
+                    outfile.write(rendered)
+                    length = len(rendered)
+                    entries_in, entries_out = chunk_stats['entries_in'], chunk_stats['entries_out']
+
+                current.add(digest, offset, offset + length, entries_in, entries_out)
+                offset += length
+                stats['entries_in'] += entries_in
+                stats['entries_out'] += entries_out
+
+            if run_start is not None:
+                _copy_range(previous_file, outfile, run_start, run_end)
+            if not len(current):
+                # Empty input: the full declutter still writes the header
+                outfile.write(_encode_output("#EXTM3U\n"))
+    finally:
+        if previous_file is not None:
+            previous_file.close()
+
+    output_stat = os.stat(output_filepath)
+    current.output_size = output_stat.st_size
+    current.output_mtime_ns = output_stat.st_mtime_ns
+    current.save(output_filepath + SNAPSHOT_SUFFIX)
+
+
+def write_playlist(items, outfile):
+    for item in items:
+        if isinstance(item, PlaylistEntry):
+            outfile.writelines(item.lines())
+        else:
+            outfile.write(item)
+
+
+def declutter_playlist(input_filepath, output_filepath, url_part1=None, url_part2=None, stages=None, incremental=False,
+                       prober=None):
     """
     Parses an M3U file, filters entries based on 'group-title',
     and modifies URLs for the remaining entries.
+
+    The input is streamed entry by entry and the output is written as it goes,
+    so memory use does not grow with the size of the playlist. The output is
+    written to a temp file and renamed into place once complete.
+
+    Args:
+        stages (list, optional): Callables taking a PlaylistEntry and returning it
+                                 (possibly modified) or None to drop it.
+                                 Defaults to build_stages(url_part1, url_part2).
+        incremental (bool): Diff the input, a few entries at a time, against the
+                            snapshot the previous run left next to the output
+                            (output_file.snapshot), and splice: unchanged chunks are
+                            copied from the previous output unparsed, and only added or
+                            changed ones go through the stages. Without a snapshot that
+                            matches the output and the stages, it's a full rebuild that
+                            writes one. See declutter_incremental.
+        prober (StreamProber, optional): Checks the kept entries' stream URLs and
+                                         drops or regroups the dead ones before
+                                         they're written. Disables 'incremental'.
+
+    Returns:
+        dict or None: {'entries_in': int, 'entries_out': int, 'entries_reused': int},
+                      or None on error.
     """
+    if stages is None:
+        stages = build_stages(url_part1, url_part2)
+    stats = {'entries_in': 0, 'entries_out': 0, 'entries_reused': 0}
+
+    key = stages_key(stages) if incremental and prober is None else None
+    if incremental and prober is None and key is None:
+        print("Warning: some stages have no key, running a full declutter instead of an incremental one")
+
     try:
-        # Read all lines from the input file into memory
-        with open(input_filepath, 'r', encoding='utf-8') as infile:
-            lines = infile.readlines() 
-            
-        with open(output_filepath, 'w', encoding='utf-8') as outfile:
+        if key is not None:
+            declutter_incremental(input_filepath, output_filepath, stages, key, stats)
+            return stats
+
+        with open(input_filepath, 'r', encoding='utf-8') as infile, \
+             atomic_write(output_filepath, 'w', encoding='utf-8') as outfile:
+            lines = iter(infile)
+            first_line = next(lines, '')
             # Ensure the output file starts with #EXTM3U
             # Check if the first line of the input is #EXTM3U (case-insensitive)
-            if lines and lines[0].strip().upper() == "#EXTM3U":
-                outfile.write(lines[0]) # Write original header line
-                start_index = 1         # Start processing from the next line
+            if first_line.strip().upper() == "#EXTM3U":
+                outfile.write(first_line) # Write original header line
             else:
                 outfile.write("#EXTM3U\n") # Add header if missing or different
-                start_index = 0         # Process all lines from the beginning
-
-            i = start_index
-            while i < len(lines):
-                current_line_raw = lines[i]
-                current_line_stripped = current_line_raw.strip()
-
-                # Check if the current line is an #EXTINF directive
-                if current_line_stripped.startswith("#EXTINF:"):
-                    extinf_line_raw = current_line_raw # Store the #EXTINF line
-                    
-                    # Check if there's a next line for the URL
-                    if i + 1 < len(lines):
-                        url_line_raw = lines[i+1] # This should be the URL line
-                        url_line_stripped = url_line_raw.strip()
-
-                        # Default to keeping the entry
-                        keep_entry = True
-                        
-                        # Parse group-title from extinf_line_raw
-                        # Regex to find group-title="...", case insensitive for "group-title" attribute name
-                        group_title_match = re.search(r'group-title="([^"]*)"', extinf_line_raw, re.IGNORECASE)
-                        
-                        if group_title_match:
-                            group_title_value = group_title_match.group(1)
-                            forbidden_substrings = blacklisted_languages
-                            # Case-insensitive check for forbidden substrings in the group-title value
-                            if any(sub.lower() in group_title_value.lower() for sub in forbidden_substrings):
-                                keep_entry = False
-                        
-                        if keep_entry:
-                            # Write the #EXTINF line
-                            outfile.write(extinf_line_raw)
-
-                            # Process and write the URL line
-                            modified_url_to_write = url_line_raw # Default to original URL line
-
-                            # Attempt to modify if it looks like a URL and contains '/live/'
-                            # Check for "://" to ensure it's a URL structure and "/live/" for the specific path part
-                            if url_part1 and url_part2 and "://" in url_line_stripped and "/live/" in url_line_stripped.lower():
-                                temp_parts = url_line_stripped.split('/')
-                                live_segment_idx = -1
-                                
-                                # Find the index of the "live" segment (case-insensitive search for "live")
-                                for idx, part in enumerate(temp_parts):
-                                    if part.lower() == "live":
-                                        live_segment_idx = idx
-                                        break
-                                
-                                # Check if "live" was found and if there are enough segments after it to modify
-                                if live_segment_idx != -1 and live_segment_idx + 2 < len(temp_parts):
-                                    temp_parts[live_segment_idx + 1] = url_part1
-                                    temp_parts[live_segment_idx + 2] = url_part2
-                                    
-                                    reconstructed_url_content = "/".join(temp_parts)
-                                    
-                                    # Preserve original newline character(s) to maintain file integrity
-                                    if url_line_raw.endswith('\r\n'): # Windows-style newline
-                                        modified_url_to_write = reconstructed_url_content + '\r\n'
-                                    elif url_line_raw.endswith('\n'): # Unix-style newline
-                                        modified_url_to_write = reconstructed_url_content + '\n'
-                                    else: # No newline at the end of the original line
-                                        modified_url_to_write = reconstructed_url_content
-                                else:
-                                    # "live" not found or URL structure after "live" is not as expected for modification.
-                                    # The original URL will be written. A warning could be printed here if desired.
-                                    # print(f"Warning: URL format issue or 'live' segment not structured for modification: {url_line_stripped}")
-                                    pass 
-                            
-                            outfile.write(modified_url_to_write)
-                        
-                        i += 2 # Processed #EXTINF and URL, so advance by 2 to get to the next pair
-                        continue 
-                    else:
-                        # #EXTINF line at the end of the file without a corresponding URL line.
-                        # This entry is incomplete. Current behavior: discard by not writing and advancing.
-                        # print(f"Warning: #EXTINF line found at end of file without a URL: {extinf_line_raw.strip()}")
-                        i += 1 # Advance past this incomplete #EXTINF line
-                        continue
-                else:
-                    # This line is not an #EXTINF line.
-                    # It could be a comment (e.g., #EXTVLCOPT), other metadata, or an empty line.
-                    # Write it to the output if it's not an empty line (after stripping).
-                    if current_line_stripped: 
-                        outfile.write(current_line_raw)
-                    # If it was an empty line (just newline characters), it will be skipped.
-                    i += 1 # Advance to the next line
-    
+                lines = itertools.chain([first_line], lines) # Process all lines from the beginning
+
+            items = apply_stages(parse_playlist(lines), stages, stats)
+            if prober is not None:
+                items = prober.filter(items, stats)
+            write_playlist(items, outfile)
+        return stats
+
     except FileNotFoundError:
         print(f"Error: Input file '{input_filepath}' not found.")
     except Exception as e:
@@ -125,7 +538,8 @@ Example usage:
 
 This will:
 1. Read 'input.m3u'.
-2. Filter out entries where 'group-title' contains 'FR', 'DE', or 'IR' (case-insensitive).
+2. Filter out entries where 'group-title' contains a blacklisted substring such as
+   'FR', 'DE', or 'IR' (case-insensitive, see --blacklist).
 3. For remaining entries, modify URLs like 'scheme://host/live/old1/old2/stream.ts'
    to 'scheme://host/live/NEW_PART_A/NEW_PART_B/stream.ts'.
 4. Write the result to 'output.m3u'.
@@ -133,12 +547,24 @@ This will:
     )
     parser.add_argument("input_file", help="Path to the input .m3u file.")
     parser.add_argument("output_file", help="Path to the output .m3u file.")
-    parser.add_argument("url_part1", help="The first segment to replace in the URL path after '/live/'.")
-    parser.add_argument("url_part2", help="The second segment to replace in the URL path after '/live/url_part1/'.")
-    
+    parser.add_argument("url_part1", help="The first segment to replace in the URL path after '/live/', '/movie/' or '/series/'.")
+    parser.add_argument("url_part2", help="The second segment to replace in the URL path, after url_part1.")
+    parser.add_argument("--blacklist", default=DEFAULT_BLACKLIST_FILE,
+                        help=f"File with group-title substrings to filter out (default: {DEFAULT_BLACKLIST_FILE}).")
+    parser.add_argument("--index", action="store_true",
+                        help="Also write a per-group/tvg-id index next to the output (output_file.idx).")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Only re-run the stages on chunks that changed since the last --incremental run\n"
+                             "into this output, reusing the rest (snapshot in output_file.snapshot).")
+
     args = parser.parse_args()
-    
-    declutter_playlist(args.input_file, args.output_file, args.url_part1, args.url_part2)
+
+    stages = build_stages(args.url_part1, args.url_part2, load_blacklist(args.blacklist))
+    stats = declutter_playlist(args.input_file, args.output_file, stages=stages, incremental=args.incremental)
+    if stats is not None and args.incremental:
+        print(f"Reused {stats['entries_reused']} of {stats['entries_in']} entries from the previous run.")
+    if stats is not None and args.index:
+        write_index(args.output_file)
     print(f"Processing complete. Output written to '{args.output_file}'.")
 
 if __name__ == "__main__":
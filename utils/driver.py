@@ -1,27 +1,159 @@
 import os
+import time
+import hashlib
 from utils.deleteOlderFiles import delete_older_files
-from utils.parsingFromLogs import extract_m3u_link_from_latest_logs
-from utils.urlDownloader import download_file
-from utils.declutterPlaylist import declutter_playlist
+from utils.parsingFromLogs import LOGS_FOLDER, LOG_PATTERN
+from utils.urlDownloader import download_file, download_counters
+from utils.declutterPlaylist import declutter_playlist, load_blacklist
 from utils.runUIAutomationScript import run_ui_automation_script
+from utils.playlistIndex import write_index
+from utils.linkCache import get_valid_cached_link, store_link, forget_link, link_cache_counters
+from utils.metrics import registry, stage
+from utils.epgSubset import EPG_OUTPUT, EPG_SOURCE_FILE, xmltv_url, surviving_tvg_ids, trim_epg
 
+OUTPUT_PLAYLIST = 'outputs/output.m3u'
 
-def driver(forceRefresh = False):
-    run_ui_automation_script(forceRefresh);
+# Records the SHA-256 of the download (and of the blacklist) the output playlist was built from
+SOURCE_HASH_SUFFIX = '.source'
 
-    # Get the m3u link
-    m3u_link = extract_m3u_link_from_latest_logs(delete_older=True)
+# How often the declutter stage was skipped because its input was unchanged
+driver_counters = {'declutter_skipped': 0, 'epg_skipped': 0}
+
+registry.expose('iptv_driver', driver_counters, help_text='Refresh pipeline counters.')
+registry.expose('iptv_download', download_counters, help_text='Playlist download outcomes.')
+registry.expose('iptv_link_cache', link_cache_counters, help_text='Cached m3u link usage.')
+
+
+def _source_hash(download_sha256):
+    blacklist_sha256 = hashlib.sha256("\n".join(load_blacklist()).encode('utf-8')).hexdigest()
+    return f"{download_sha256}:{blacklist_sha256}"
+
+
+def _read_source_hash(output_path):
+    try:
+        with open(output_path + SOURCE_HASH_SUFFIX, 'r', encoding='utf-8') as source_file:
+            return source_file.read().strip()
+    except FileNotFoundError:
+        return None
+
+
+def _write_source_hash(output_path, sha256):
+    with open(output_path + SOURCE_HASH_SUFFIX, 'w', encoding='utf-8') as source_file:
+        source_file.write(sha256)
+
+
+def get_m3u_link_from_browser(forceRefresh = False):
+    """
+    Runs the UI.Vision macro in Firefox and reads the m3u link from its log,
+    caching the link for later refreshes. Returns None if no log written since
+    the launch held a link, rather than falling back to an older one.
+    """
+    started = time.perf_counter()
+    # Returns as soon as the link shows up in the macro's log, or None on timeout
+    with stage('automation'):
+        m3u_link = run_ui_automation_script(forceRefresh);
+
+    # Only the runner's link is fresh: it only reads logs written since the browser
+    # was launched, while the newest log on disk may be a previous run's
+    with stage('log_cleanup'):
+        delete_older_files(os.path.join(LOGS_FOLDER, LOG_PATTERN), keep=1)
+    if m3u_link:
+        store_link(m3u_link, time.perf_counter() - started)
+    return m3u_link
+
+
+def refresh_epg(m3u_link):
+    """
+    Downloads the provider's XMLTV guide, unless it hasn't changed, and trims it
+    to the channels left in the output playlist.
+    """
+    epg_url = xmltv_url(m3u_link)
+    if epg_url is None:
+        print("Not an Xtream link, so there is no guide to fetch")
+        return None
+
+    download_stats = {}
+    with stage('epg_download') as record:
+        source_path = download_file(epg_url, "my_downloads", custom_filename=EPG_SOURCE_FILE, stats=download_stats,
+                                    conditional=True, show_progress=False)
+        record['bytes'] = download_stats.get('bytes')
+    if not source_path:
+        print("Could not download the guide")
+        return None
+
+    # The guide only needs trimming again if it or the set of kept channels changed
+    tvg_ids = surviving_tvg_ids(OUTPUT_PLAYLIST)
+    tvg_ids_sha256 = hashlib.sha256("\n".join(sorted(tvg_ids)).encode('utf-8')).hexdigest()
+    source_hash = f"{download_stats['sha256']}:{tvg_ids_sha256}" if download_stats.get('sha256') else None
+    if os.path.exists(EPG_OUTPUT) and source_hash and _read_source_hash(EPG_OUTPUT) == source_hash:
+        driver_counters['epg_skipped'] += 1
+        print("Guide and channels unchanged, skipping the guide trim")
+        return EPG_OUTPUT
+
+    with stage('epg') as record:
+        epg_stats = trim_epg(source_path, EPG_OUTPUT, tvg_ids)
+        record['bytes'] = os.path.getsize(source_path)
+        record['entries_in'] = epg_stats['programmes_in']
+        record['entries_out'] = epg_stats['programmes_out']
+    print(f"Guide trimmed to {epg_stats['channels_out']} of {epg_stats['channels_in']} channels")
+    if source_hash:
+        _write_source_hash(EPG_OUTPUT, source_hash)
+    return EPG_OUTPUT
+
+
+def driver(forceRefresh = False, prober = None, use_link_cache = True, epg = False):
+    # The browser only runs when the cached link is missing or rejected upstream
+    m3u_link = None
+    if use_link_cache:
+        with stage('link_check'):
+            m3u_link = get_valid_cached_link()
+    from_cache = m3u_link is not None
+    if not from_cache:
+        m3u_link = get_m3u_link_from_browser(forceRefresh)
 
     if m3u_link:
         print(f"Got the m3u link: {m3u_link}")
-        # With the m3u Link, download the file
-        downloaded_playlist_path = download_file(m3u_link, "my_downloads")
-        
+        # With the m3u Link, download the file, unless upstream hasn't changed since last time
+        download_stats = {}
+        with stage('download') as record:
+            downloaded_playlist_path = download_file(m3u_link, "my_downloads", stats=download_stats, conditional=True)
+            record['bytes'] = download_stats.get('bytes')
+        if not downloaded_playlist_path and from_cache:
+            print("Cached m3u link failed to download, getting a fresh one from the browser")
+            forget_link()
+            return driver(forceRefresh, prober, use_link_cache=False, epg=epg)
+        if not downloaded_playlist_path:
+            print("Could not download the playlist")
+            return None
+
         pattern = os.path.join("my_downloads", "tv_channels_*.m3u")
-        delete_older_files(pattern)
-        
-        # With the file downloaded, declutter the playlist
-        declutter_playlist(downloaded_playlist_path, 'outputs/output.m3u')
+        with stage('cleanup'):
+            delete_older_files(pattern)
+
+        source_hash = _source_hash(download_stats['sha256']) if download_stats.get('sha256') else None
+        # Probe verdicts expire, so a probing run never counts as unchanged
+        if prober is None and os.path.exists(OUTPUT_PLAYLIST) and source_hash and _read_source_hash(OUTPUT_PLAYLIST) == source_hash:
+            driver_counters['declutter_skipped'] += 1
+            print(f"Playlist unchanged, skipping declutter "
+                  f"(skipped {driver_counters['declutter_skipped']} times so far)")
+        else:
+            # With the file downloaded, declutter the playlist, and index it for the per-group endpoints
+            with stage('declutter') as record:
+                declutter_stats = declutter_playlist(downloaded_playlist_path, OUTPUT_PLAYLIST, incremental=True, prober=prober)
+                record['bytes'] = os.path.getsize(downloaded_playlist_path)
+                if declutter_stats is not None:
+                    record['entries_in'] = declutter_stats['entries_in']
+                    record['entries_out'] = declutter_stats['entries_out']
+            if declutter_stats is None:
+                return m3u_link
+            with stage('index') as record:
+                record['entries_out'] = len(write_index(OUTPUT_PLAYLIST))
+            if source_hash:
+                _write_source_hash(OUTPUT_PLAYLIST, source_hash)
+
+        # The guide changes daily even when the channel list doesn't
+        if epg:
+            refresh_epg(m3u_link)
         return m3u_link
     else:
         print("Could not find an m3u link")
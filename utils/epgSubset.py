@@ -0,0 +1,131 @@
+# python -m utils.epgSubset my_downloads/epg_source.xml outputs/output.m3u outputs/epg.xml.gz
+import io
+import gzip
+import argparse
+import xml.etree.ElementTree as ET
+from urllib.parse import urlencode
+
+from utils.atomicFile import atomic_write
+from utils.linkCache import parse_xtream_link
+from utils.playlistIndex import INDEX_SUFFIX, PlaylistIndex, write_index
+
+EPG_OUTPUT = "outputs/epg.xml.gz"
+EPG_SOURCE_FILE = "epg_source.xml"
+
+GZIP_MAGIC = b"\x1f\x8b"
+
+
+def xmltv_url(m3u_link):
+    """
+    The provider's XMLTV guide for an Xtream 'get.php' link, or None if it isn't one.
+    """
+    parsed = parse_xtream_link(m3u_link)
+    if parsed is None:
+        return None
+    base_url, username, password = parsed
+    return f"{base_url}/xmltv.php?{urlencode({'username': username, 'password': password})}"
+
+
+def surviving_tvg_ids(m3u_filepath):
+    """
+    The tvg-ids left in an output playlist, read from its index.
+    """
+    try:
+        index = PlaylistIndex.load(m3u_filepath + INDEX_SUFFIX)
+    except (OSError, ValueError, EOFError, KeyError):
+        index = write_index(m3u_filepath)
+    return set(index.tvg_ranges)
+
+
+def _open_source(source_filepath):
+    # Providers serve the guide either plain or gzipped, whatever the file is called
+    with open(source_filepath, 'rb') as probe:
+        is_gzip = probe.read(2) == GZIP_MAGIC
+    return gzip.open(source_filepath, 'rb') if is_gzip else open(source_filepath, 'rb')
+
+
+def _root_tag(root):
+    attributes = "".join(f' {name}="{_escape_attribute(value)}"' for name, value in root.attrib.items())
+    return f"<{root.tag}{attributes}>\n"
+
+
+def _escape_attribute(value):
+    return (value.replace('&', '&amp;').replace('<', '&lt;').replace('"', '&quot;')
+            .replace('\n', '&#10;'))
+
+
+def trim_epg(source_filepath, output_filepath, tvg_ids, stats=None):
+    """
+    Writes a gzipped XMLTV guide holding only the channels in 'tvg_ids' and
+    their programmes (matched case-insensitively).
+
+    The source is parsed as a stream and every element is dropped once it has
+    been handled, so memory stays flat however large the guide is.
+
+    Args:
+        stats (dict, optional): Filled in with channels/programmes in and out.
+
+    Returns:
+        dict: The stats.
+    """
+    wanted = {tvg_id.lower() for tvg_id in tvg_ids}
+    if stats is None:
+        stats = {}
+    stats.update({'channels_in': 0, 'channels_out': 0, 'programmes_in': 0, 'programmes_out': 0})
+
+    with _open_source(source_filepath) as source, atomic_write(output_filepath, 'wb') as raw_output:
+        with gzip.GzipFile(fileobj=raw_output, mode='wb', compresslevel=6, mtime=0) as gzip_output:
+            output = io.TextIOWrapper(gzip_output, encoding='utf-8')
+            output.write('<?xml version="1.0" encoding="UTF-8"?>\n<!DOCTYPE tv SYSTEM "xmltv.dtd">\n')
+
+            root = None
+            depth = 0
+            for event, element in ET.iterparse(source, events=('start', 'end')):
+                if event == 'start':
+                    if root is None:
+                        root = element
+                        output.write(_root_tag(root))
+                    depth += 1
+                    continue
+
+                depth -= 1
+                # Only direct children of <tv> are decided on; their contents come along with them
+                if depth != 1:
+                    continue
+                if element.tag == 'channel':
+                    stats['channels_in'] += 1
+                    keep = element.get('id', '').lower() in wanted
+                    stats['channels_out'] += keep
+                elif element.tag == 'programme':
+                    stats['programmes_in'] += 1
+                    keep = element.get('channel', '').lower() in wanted
+                    stats['programmes_out'] += keep
+                else:
+                    keep = False
+                if keep:
+                    element.tail = "\n"
+                    output.write(ET.tostring(element, encoding='unicode'))
+                # Detach the handled element so the tree never grows past one child
+                root.clear()
+
+            if root is not None:
+                output.write(f"</{root.tag}>\n")
+            output.flush()
+            output.detach()
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Trim an XMLTV guide to the channels left in a playlist.")
+    parser.add_argument("source_file", help="Path to the provider's XMLTV guide (plain or gzipped).")
+    parser.add_argument("m3u_file", help="Path to the decluttered playlist whose tvg-ids are kept.")
+    parser.add_argument("output_file", nargs='?', default=EPG_OUTPUT, help=f"Gzipped guide to write (default: {EPG_OUTPUT})")
+
+    args = parser.parse_args()
+
+    stats = trim_epg(args.source_file, args.output_file, surviving_tvg_ids(args.m3u_file))
+    print(f"Kept {stats['channels_out']} of {stats['channels_in']} channels and "
+          f"{stats['programmes_out']} of {stats['programmes_in']} programmes")
+
+if __name__ == "__main__":
+    main()
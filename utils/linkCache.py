@@ -0,0 +1,135 @@
+import os
+import json
+import time
+from urllib.parse import urlsplit, parse_qs
+
+import requests
+
+from utils.atomicFile import atomic_write
+from utils.urlDownloader import get_session
+
+LINK_CACHE_FILE = os.path.join("my_downloads", "link_cache.json")
+CHECK_TIMEOUT = (5, 10)
+
+# Cache hits/misses and the browser time they saved, for logging and metrics
+link_cache_counters = {'hits': 0, 'misses': 0, 'seconds_saved': 0.0}
+
+
+def parse_xtream_link(m3u_link):
+    """
+    Splits an Xtream Codes 'get.php?username=..&password=..' link.
+
+    Returns:
+        tuple or None: (base_url, username, password), or None if it isn't one.
+    """
+    parts = urlsplit(m3u_link)
+    query = parse_qs(parts.query)
+    if 'username' not in query or 'password' not in query:
+        return None
+    return f"{parts.scheme}://{parts.netloc}", query['username'][0], query['password'][0]
+
+
+def load_cached_link(cache_filepath=LINK_CACHE_FILE):
+    try:
+        with open(cache_filepath, 'r', encoding='utf-8') as cache_file:
+            return json.load(cache_file)
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def save_cached_link(record, cache_filepath=LINK_CACHE_FILE):
+    with atomic_write(cache_filepath) as cache_file:
+        json.dump(record, cache_file, indent=2)
+
+
+def store_link(m3u_link, browser_seconds, cache_filepath=LINK_CACHE_FILE):
+    """
+    Remembers a link freshly extracted by the browser, and how long getting it took.
+    """
+    credentials = parse_xtream_link(m3u_link)
+    save_cached_link({
+        'link': m3u_link,
+        'username': credentials[1] if credentials else None,
+        'password': credentials[2] if credentials else None,
+        'extracted_at': time.time(),
+        'expires_at': None,
+        'browser_seconds': browser_seconds,
+    }, cache_filepath)
+
+
+def forget_link(cache_filepath=LINK_CACHE_FILE):
+    try:
+        os.remove(cache_filepath)
+    except FileNotFoundError:
+        pass
+
+
+def check_link(m3u_link):
+    """
+    Cheaply checks that a link still works: the Xtream 'player_api.php' account
+    info when the link carries credentials, otherwise a HEAD request.
+
+    Returns:
+        tuple: (valid, expires_at) where expires_at is a Unix time or None.
+    """
+    session = get_session()
+    credentials = parse_xtream_link(m3u_link)
+    try:
+        if credentials:
+            base_url, username, password = credentials
+            response = session.get(f"{base_url}/player_api.php",
+                                   params={'username': username, 'password': password}, timeout=CHECK_TIMEOUT)
+            if response.status_code >= 400:
+                return False, None
+            try:
+                user_info = response.json().get('user_info') or {}
+            except ValueError:
+                user_info = {}
+            if user_info:
+                expires_at = float(user_info['exp_date']) if user_info.get('exp_date') else None
+                active = str(user_info.get('auth')) == '1' and str(user_info.get('status', 'Active')).lower() == 'active'
+                return active and (expires_at is None or expires_at > time.time()), expires_at
+            # Not an Xtream panel after all; fall through to a HEAD on the link
+
+        with session.head(m3u_link, timeout=CHECK_TIMEOUT, allow_redirects=True) as response:
+            return response.status_code < 400, None
+    except requests.exceptions.RequestException as e:
+        print(f"Could not check the cached m3u link: {e}")
+        return False, None
+
+
+def get_valid_cached_link(cache_filepath=LINK_CACHE_FILE):
+    """
+    Returns the cached m3u link if it is still accepted upstream, else None.
+    Hits, misses and the browser time saved are printed and counted.
+    """
+    record = load_cached_link(cache_filepath)
+    if not record or not record.get('link'):
+        link_cache_counters['misses'] += 1
+        print("No cached m3u link, running the browser automation")
+        return None
+
+    if record.get('expires_at') and record['expires_at'] <= time.time():
+        link_cache_counters['misses'] += 1
+        print("Cached m3u link has expired, running the browser automation")
+        return None
+
+    started = time.perf_counter()
+    valid, expires_at = check_link(record['link'])
+    check_seconds = time.perf_counter() - started
+    if not valid:
+        link_cache_counters['misses'] += 1
+        print(f"Cached m3u link was rejected ({check_seconds:.2f}s check), running the browser automation")
+        return None
+
+    if expires_at != record.get('expires_at'):
+        record['expires_at'] = expires_at
+        save_cached_link(record, cache_filepath)
+
+    saved = max(0.0, (record.get('browser_seconds') or 0.0) - check_seconds)
+    link_cache_counters['hits'] += 1
+    link_cache_counters['seconds_saved'] += saved
+    print(f"Cached m3u link is still valid ({check_seconds:.2f}s check), skipped the browser "
+          f"and saved ~{saved:.1f}s ({link_cache_counters['hits']} hits, "
+          f"{link_cache_counters['seconds_saved']:.0f}s saved so far)")
+    return record['link']
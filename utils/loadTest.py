@@ -0,0 +1,100 @@
+# python -m utils.loadTest --url http://localhost:8123/ --concurrency 16 --duration 10
+import argparse
+import http.client
+import threading
+import time
+from urllib.parse import urlparse
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def run_load_test(url, concurrency=16, duration=10.0, headers=None):
+    """
+    Hammers a URL from several keep-alive connections for a fixed time.
+
+    Args:
+        url (str): The playlist URL to fetch.
+        concurrency (int): Number of concurrent clients, one connection each.
+        duration (float): Seconds to run for.
+        headers (dict, optional): Extra request headers, e.g. Accept-Encoding.
+
+    Returns:
+        dict: requests, errors, requests_per_sec, p50_ms, p99_ms, max_ms
+    """
+    parsed = urlparse(url)
+    path = parsed.path or '/'
+    if parsed.query:
+        path += '?' + parsed.query
+    headers = headers or {}
+
+    latencies = []
+    errors = [0]
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+
+    def client():
+        local_latencies = []
+        local_errors = 0
+        connection = http.client.HTTPConnection(parsed.hostname, parsed.port or 80, timeout=30)
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            try:
+                connection.request('GET', path, headers=headers)
+                response = connection.getresponse()
+                response.read()
+                if response.status >= 400:
+                    local_errors += 1
+                    continue
+                local_latencies.append(time.perf_counter() - start)
+            except (OSError, http.client.HTTPException):
+                local_errors += 1
+                connection.close()
+                connection = http.client.HTTPConnection(parsed.hostname, parsed.port or 80, timeout=30)
+        connection.close()
+        with lock:
+            latencies.extend(local_latencies)
+            errors[0] += local_errors
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=client) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        'requests': len(latencies),
+        'errors': errors[0],
+        'requests_per_sec': len(latencies) / elapsed if elapsed else 0.0,
+        'p50_ms': percentile(latencies, 0.50) * 1000,
+        'p99_ms': percentile(latencies, 0.99) * 1000,
+        'max_ms': (latencies[-1] * 1000) if latencies else 0.0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure requests/sec and latency of a running playlist server')
+    parser.add_argument('--url', default='http://localhost:8123/', help='Playlist URL (default: http://localhost:8123/)')
+    parser.add_argument('--concurrency', type=int, default=16, help='Concurrent clients (default: 16)')
+    parser.add_argument('--duration', type=float, default=10.0, help='Seconds to run (default: 10)')
+    parser.add_argument('--gzip', action='store_true', help='Send Accept-Encoding: gzip')
+
+    args = parser.parse_args()
+
+    headers = {'Accept-Encoding': 'gzip'} if args.gzip else {}
+    result = run_load_test(args.url, args.concurrency, args.duration, headers)
+    print(f"Requests:     {result['requests']} ({result['errors']} errors)")
+    print(f"Throughput:   {result['requests_per_sec']:.1f} req/s")
+    print(f"Latency p50:  {result['p50_ms']:.2f} ms")
+    print(f"Latency p99:  {result['p99_ms']:.2f} ms")
+    print(f"Latency max:  {result['max_ms']:.2f} ms")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,229 @@
+import os
+import sys
+import time
+import cProfile
+import threading
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+# Request latencies, in seconds
+REQUEST_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+# Refresh stage durations, in seconds; the browser alone can take minutes
+STAGE_BUCKETS = (0.01, 0.1, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+
+def peak_rss_bytes():
+    """
+    The process's peak resident set size so far, in bytes, or None if it can't be measured.
+    """
+    if resource is not None:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Kilobytes on Linux, bytes on macOS
+        return peak if sys.platform == 'darwin' else peak * 1024
+    if psutil is not None:
+        memory = psutil.Process().memory_info()
+        # Windows reports the peak working set; elsewhere the current RSS is the best there is
+        return getattr(memory, 'peak_wset', memory.rss)
+    return None
+
+
+def _labels_key(labels):
+    return tuple(sorted(labels.items())) if labels else ()
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labels_key, extra=()):
+    pairs = list(labels_key) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(int(value))
+
+
+class MetricsRegistry:
+    """
+    Counters, gauges and histograms, rendered in the Prometheus text format.
+    Plain counter dicts kept elsewhere (e.g. download_counters) can be exposed
+    as they are, and are read at render time.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._families = {}   # name: (kind, help, buckets)
+        self._samples = {}    # name: {labels_key: value, or [bucket counts, sum, count] for histograms}
+        self._exposed = {}    # prefix: (source, kind, help)
+
+    def describe(self, name, kind, help_text, buckets=None):
+        with self._lock:
+            if name not in self._families:
+                self._families[name] = (kind, help_text, tuple(buckets) if buckets else None)
+                self._samples[name] = {}
+
+    def inc(self, name, value=1, labels=None):
+        key = _labels_key(labels)
+        with self._lock:
+            samples = self._samples[name]
+            samples[key] = samples.get(key, 0) + value
+
+    def set(self, name, value, labels=None):
+        with self._lock:
+            self._samples[name][_labels_key(labels)] = value
+
+    def observe(self, name, value, labels=None):
+        key = _labels_key(labels)
+        with self._lock:
+            buckets = self._families[name][2]
+            sample = self._samples[name].get(key)
+            if sample is None:
+                sample = self._samples[name][key] = [[0] * len(buckets), 0.0, 0]
+            for position, upper_bound in enumerate(buckets):
+                if value <= upper_bound:
+                    sample[0][position] += 1
+            sample[1] += value
+            sample[2] += 1
+
+    def expose(self, prefix, source, kind='counter', help_text=''):
+        """
+        Exposes every numeric value of a dict (or of the dict a callable returns)
+        as '<prefix>_<key>'. Exposing the same prefix again replaces the source.
+        """
+        with self._lock:
+            self._exposed[prefix] = (source, kind, help_text)
+
+    def render(self):
+        lines = []
+        with self._lock:
+            for name, (kind, help_text, buckets) in self._families.items():
+                lines.append(f'# HELP {name} {help_text}')
+                lines.append(f'# TYPE {name} {kind}')
+                for key, value in self._samples[name].items():
+                    if kind != 'histogram':
+                        lines.append(f'{name}{_format_labels(key)} {_format_value(value)}')
+                        continue
+                    counts, total, count = value
+                    for upper_bound, bucket_count in zip(buckets, counts):
+                        lines.append(f'{name}_bucket{_format_labels(key, [("le", upper_bound)])} {bucket_count}')
+                    lines.append(f'{name}_bucket{_format_labels(key, [("le", "+Inf")])} {count}')
+                    lines.append(f'{name}_sum{_format_labels(key)} {_format_value(total)}')
+                    lines.append(f'{name}_count{_format_labels(key)} {count}')
+            exposed = list(self._exposed.items())
+
+        for prefix, (source, kind, help_text) in exposed:
+            values = source() if callable(source) else dict(source)
+            for key, value in values.items():
+                if isinstance(value, bool):
+                    value = int(value)
+                if not isinstance(value, (int, float)):
+                    continue
+                name = f'{prefix}_{key}' + ('_total' if kind == 'counter' and not key.endswith('_total') else '')
+                lines.append(f'# HELP {name} {help_text}')
+                lines.append(f'# TYPE {name} {kind}')
+                lines.append(f'{name} {_format_value(value)}')
+        return '\n'.join(lines) + '\n'
+
+
+registry = MetricsRegistry()
+
+registry.describe('iptv_stage_duration_seconds', 'histogram', 'Wall time of each refresh stage.', STAGE_BUCKETS)
+registry.describe('iptv_stage_runs_total', 'counter', 'Refresh stage runs.')
+registry.describe('iptv_stage_failures_total', 'counter', 'Refresh stage runs that raised.')
+registry.describe('iptv_stage_bytes_total', 'counter', 'Bytes processed by each refresh stage.')
+registry.describe('iptv_stage_last_duration_seconds', 'gauge', 'Wall time of the latest run of each refresh stage.')
+registry.describe('iptv_stage_last_bytes', 'gauge', 'Bytes processed by the latest run of each refresh stage.')
+registry.describe('iptv_stage_last_entries_in', 'gauge', 'Playlist entries read by the latest run of each refresh stage.')
+registry.describe('iptv_stage_last_entries_out', 'gauge', 'Playlist entries written by the latest run of each refresh stage.')
+registry.describe('iptv_stage_peak_rss_bytes', 'gauge', 'Process peak RSS when each refresh stage last finished.')
+registry.describe('iptv_http_requests_total', 'counter', 'HTTP requests served, by route and status.')
+registry.describe('iptv_http_response_bytes_total', 'counter', 'Bytes of whole cached files (playlist, views, guide) sent, by content coding.')
+registry.describe('iptv_http_request_duration_seconds', 'histogram', 'HTTP request latency, by route.', REQUEST_BUCKETS)
+
+
+@contextmanager
+def stage(name, metrics=None):
+    """
+    Times one refresh stage and records it. The stage fills in what it knows
+    of the yielded dict: 'bytes', 'entries_in', 'entries_out'.
+
+        with stage('download') as record:
+            record['bytes'] = ...
+    """
+    metrics = metrics or registry
+    record = {'bytes': None, 'entries_in': None, 'entries_out': None}
+    labels = {'stage': name}
+    started = time.perf_counter()
+    try:
+        yield record
+    except BaseException:
+        metrics.inc('iptv_stage_failures_total', labels=labels)
+        raise
+    finally:
+        seconds = time.perf_counter() - started
+        peak_rss = peak_rss_bytes()
+        metrics.inc('iptv_stage_runs_total', labels=labels)
+        metrics.observe('iptv_stage_duration_seconds', seconds, labels)
+        metrics.set('iptv_stage_last_duration_seconds', seconds, labels)
+        if peak_rss is not None:
+            metrics.set('iptv_stage_peak_rss_bytes', peak_rss, labels)
+        if record['bytes'] is not None:
+            metrics.inc('iptv_stage_bytes_total', record['bytes'], labels)
+            metrics.set('iptv_stage_last_bytes', record['bytes'], labels)
+        for field in ('entries_in', 'entries_out'):
+            if record[field] is not None:
+                metrics.set(f'iptv_stage_last_{field}', record[field], labels)
+
+        summary = [f"{seconds:.2f}s"]
+        if record['bytes'] is not None:
+            summary.append(f"{record['bytes'] / (1024 * 1024):.1f} MB")
+        if record['entries_in'] is not None and record['entries_out'] is not None:
+            summary.append(f"entries {record['entries_in']} -> {record['entries_out']}")
+        elif record['entries_out'] is not None:
+            summary.append(f"{record['entries_out']} entries")
+        if peak_rss is not None:
+            summary.append(f"peak RSS {peak_rss / (1024 * 1024):.0f} MB")
+        print(f"Stage {name}: {', '.join(summary)}")
+
+
+def observe_request(route, status, seconds, metrics=None):
+    metrics = metrics or registry
+    metrics.inc('iptv_http_requests_total', labels={'route': route, 'status': status})
+    metrics.observe('iptv_http_request_duration_seconds', seconds, {'route': route})
+
+
+def profiled(fn, profile_dir=None):
+    """
+    Wraps a refresh function so each call is run under cProfile and its stats
+    dumped to 'profile_dir' as refresh-<timestamp>.prof (open with pstats or
+    snakeviz). Returns 'fn' itself when no directory is given. Only the calling
+    thread is profiled.
+    """
+    if not profile_dir:
+        return fn
+
+    def run(*args, **kwargs):
+        os.makedirs(profile_dir, exist_ok=True)
+        profile = cProfile.Profile()
+        profile.enable()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            profile.disable()
+            profile_path = os.path.join(profile_dir, time.strftime('refresh-%Y%m%d-%H%M%S.prof'))
+            profile.dump_stats(profile_path)
+            print(f"Refresh profile written to {profile_path}")
+    return run
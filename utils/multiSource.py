@@ -0,0 +1,208 @@
+# python -m utils.multiSource --sources sources.txt --output outputs/output.m3u --prefer fastest
+import re
+import time
+import hashlib
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+
+from utils.atomicFile import atomic_write
+from utils.urlDownloader import download_file
+from utils.declutterPlaylist import PlaylistEntry, parse_playlist, apply_stages, build_stages
+from utils.playlistIndex import write_index
+
+DEFAULT_SOURCES_FILE = "sources.txt"
+
+# Quality/format tags that don't make two channels different, e.g. "BBC One HD" vs "BBC One"
+_NAME_NOISE_RE = re.compile(r'\b(?:u?hd|fhd|sd|4k|uhd|hevc|h265|raw|backup|vip)\b|[^\w]+', re.IGNORECASE)
+
+
+def load_sources(sources_filepath=DEFAULT_SOURCES_FILE):
+    """
+    Reads playlist URLs, one per line, in order of preference ('#' starts a comment).
+    """
+    sources = []
+    with open(sources_filepath, 'r', encoding='utf-8') as sources_file:
+        for line in sources_file:
+            line = line.strip()
+            if line and not line.startswith('#'):
+                sources.append(line)
+    return sources
+
+
+def channel_key(entry):
+    """
+    Identifies the same channel across providers: its tvg-id, or failing that
+    its display name with case, punctuation and quality tags stripped.
+    """
+    tvg_id = entry.tvg_id
+    if tvg_id:
+        return 'id:' + tvg_id.lower()
+    name = entry.extinf.rsplit(',', 1)[-1]
+    return 'name:' + _NAME_NOISE_RE.sub('', name).lower()
+
+
+def _fetch(rank, url, save_directory):
+    """
+    Downloads one source. Runs on a pool thread.
+    """
+    result = {'rank': rank, 'url': url, 'path': None, 'entries_in': 0, 'entries_kept': 0, 'entries_contributed': 0,
+              'bytes': 0, 'download_seconds': None, 'bytes_per_second': None, 'parse_seconds': None, 'error': None}
+
+    download_stats = {}
+    filename = "source_" + hashlib.blake2b(url.encode('utf-8'), digest_size=6).hexdigest() + ".m3u"
+    path = download_file(url, save_directory, custom_filename=filename, stats=download_stats,
+                         conditional=True, show_progress=False)
+    if not path:
+        result['error'] = 'download failed'
+        return result
+    result['path'] = path
+    result['bytes'] = download_stats.get('bytes', 0)
+    result['download_seconds'] = download_stats.get('seconds')
+    result['bytes_per_second'] = download_stats.get('bytes_per_second')
+    return result
+
+
+def _merge_source(result, stages, seen, outfile):
+    """
+    Streams one downloaded source through the stages and appends the entries
+    for channels not already written. If the file can't be read to the end,
+    whatever it had contributed is taken back out and the source is skipped.
+    """
+    started = time.perf_counter()
+    stats = {'entries_in': 0, 'entries_out': 0}
+    mark = outfile.tell()
+    added = []
+    try:
+        with open(result['path'], 'r', encoding='utf-8') as infile:
+            for item in apply_stages(parse_playlist(infile), stages, stats):
+                if not isinstance(item, PlaylistEntry):
+                    continue
+                key = channel_key(item)
+                if key in seen:
+                    continue
+                seen.add(key)
+                added.append(key)
+                outfile.writelines(item.lines())
+    except (OSError, UnicodeDecodeError) as e:
+        outfile.seek(mark)
+        outfile.truncate()
+        seen.difference_update(added)
+        result['error'] = f'could not parse ({e})'
+        return
+    result['parse_seconds'] = time.perf_counter() - started
+    result['entries_in'] = stats['entries_in']
+    result['entries_kept'] = stats['entries_out']
+    result['entries_contributed'] = len(added)
+
+
+def _preference_order(results, prefer):
+    usable = [result for result in results if result['error'] is None]
+    if prefer == 'fastest':
+        # A 304 carries the throughput of the source's last real download, so an
+        # unchanged provider keeps its place; only sources never timed go last
+        def speed(result):
+            if not result['bytes_per_second']:
+                return (1, result['rank'])
+            return (0, -result['bytes_per_second'])
+        return sorted(usable, key=speed)
+    return sorted(usable, key=lambda result: result['rank'])
+
+
+def ingest_sources(sources, output_filepath, save_directory="my_downloads", stages=None, prefer='order',
+                   max_workers=4, index=True):
+    """
+    Downloads several provider playlists concurrently, then merges them into a
+    single output with one entry per channel.
+
+    The downloads run in parallel; the merge then streams each downloaded file
+    in preference order straight into the output, so only the set of channel
+    keys already written is held in memory, however large the sources are.
+
+    Args:
+        sources (list): Playlist URLs, most preferred first.
+        output_filepath (str): Where to write the merged playlist.
+        stages (list, optional): Filter stages, default build_stages() without URL rewriting.
+        prefer (str): 'order' keeps each channel from the earliest source listing it;
+                      'fastest' ranks sources by download throughput, as last
+                      measured for each (a 304 reuses the stored figure).
+        max_workers (int): Sources downloaded at the same time.
+        index (bool): Also write the per-group/tvg-id index next to the output.
+
+    Returns:
+        dict or None: Timings per stage and per source, or None if no source could be read.
+    """
+    if stages is None:
+        stages = build_stages()
+    timings = {}
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        futures = [pool.submit(_fetch, rank, url, save_directory) for rank, url in enumerate(sources)]
+        results = [future.result() for future in futures]
+    timings['download'] = time.perf_counter() - started
+
+    ordered = _preference_order(results, prefer)
+    if not ordered:
+        print("Error: none of the sources could be downloaded")
+        return None
+
+    started = time.perf_counter()
+    seen = set()
+    try:
+        with atomic_write(output_filepath, 'w', encoding='utf-8') as outfile:
+            outfile.write("#EXTM3U\n")
+            for result in ordered:
+                _merge_source(result, stages, seen, outfile)
+            if all(result['error'] for result in ordered):
+                # Raising discards the temp file, leaving the previous output in place
+                raise ValueError("none of the sources could be read")
+    except ValueError as e:
+        print(f"Error: {e}")
+        return None
+    timings['merge'] = time.perf_counter() - started
+
+    if index:
+        started = time.perf_counter()
+        write_index(output_filepath)
+        timings['index'] = time.perf_counter() - started
+
+    report = {
+        'stages': timings,
+        'entries_out': len(seen),
+        'sources': [{key: value for key, value in result.items() if key != 'path'} for result in results],
+    }
+    print_report(report)
+    return report
+
+
+def print_report(report):
+    print("Stage timings:")
+    for stage, seconds in report['stages'].items():
+        print(f"  {stage:<17} {seconds:8.3f}s")
+    print("Sources:")
+    for source in report['sources']:
+        if source['error']:
+            print(f"  [{source['rank']}] {source['error']}: {source['url']}")
+            continue
+        download = f"{source['download_seconds']:.2f}s" if source['download_seconds'] is not None else "-"
+        print(f"  [{source['rank']}] {source['entries_in']} in, {source['entries_kept']} kept, "
+              f"{source['entries_contributed']} used; download {download}, "
+              f"parse {source['parse_seconds']:.2f}s: {source['url']}")
+    print(f"Merged playlist: {report['entries_out']} channels")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Download several M3U playlists concurrently and merge them.")
+    parser.add_argument("--sources", default=DEFAULT_SOURCES_FILE,
+                        help=f"File with one playlist URL per line, most preferred first (default: {DEFAULT_SOURCES_FILE})")
+    parser.add_argument("--output", default="outputs/output.m3u", help="Merged playlist path (default: outputs/output.m3u)")
+    parser.add_argument("--prefer", choices=['order', 'fastest'], default='order',
+                        help="Which source wins for a channel listed by several (default: order)")
+    parser.add_argument("--workers", type=int, default=4, help="Sources fetched at the same time (default: 4)")
+
+    args = parser.parse_args()
+
+    ingest_sources(load_sources(args.sources), args.output, prefer=args.prefer, max_workers=args.workers)
+
+if __name__ == "__main__":
+    main()
@@ -1,41 +1,113 @@
 import re
 import os
-import glob
+import fnmatch
 
 from utils.deleteOlderFiles import delete_older_files
 
+M3U_LINK_RE = re.compile(rb'\[echo\] m3uLink = (http[^\s]+)')
+LOG_PATTERN = "iptvlogs*.txt"
+# UI.Vision's 'savelog' ends up in the browser's download folder
+LOGS_FOLDER = os.path.join(os.path.expanduser("~"), "Downloads")
+BLOCK_SIZE = 1024 * 1024 # Read the log backwards 1 MB at a time
+
+# (path, size, mtime_ns) -> extracted link, so an unchanged log is never re-read
+_link_cache = {}
+
+
+def find_newest_file(folder, pattern, modified_after_ns=0):
+    """
+    Returns the most recently modified file in 'folder' matching 'pattern', in a
+    single directory scan, or None if there is none (modified after 'modified_after_ns').
+    """
+    newest_path, newest_stat = None, None
+    try:
+        with os.scandir(folder) as entries:
+            for entry in entries:
+                if not fnmatch.fnmatch(entry.name, pattern) or not entry.is_file():
+                    continue
+                stat = entry.stat()
+                if stat.st_mtime_ns < modified_after_ns:
+                    continue
+                if newest_stat is None or stat.st_mtime_ns > newest_stat.st_mtime_ns:
+                    newest_path, newest_stat = entry.path, stat
+    except FileNotFoundError:
+        return None
+    return newest_path
+
+
+def find_last_match(filepath, pattern, block_size=BLOCK_SIZE):
+    """
+    Returns the last match of a bytes regex in a file, reading it backwards in
+    blocks so only the tail is read when the match is near the end.
+    Matches must not span lines.
+    """
+    with open(filepath, 'rb') as file:
+        position = file.seek(0, os.SEEK_END)
+        carry = b''
+        while position > 0:
+            read_size = min(block_size, position)
+            position -= read_size
+            file.seek(position)
+            buffer = file.read(read_size) + carry
+
+            if position > 0:
+                # The first line may continue in the previous block; search it next round
+                first_newline = buffer.find(b'\n')
+                if first_newline == -1:
+                    carry = buffer
+                    continue
+                carry, buffer = buffer[:first_newline], buffer[first_newline:]
+            else:
+                carry = b''
+
+            last = None
+            for last in pattern.finditer(buffer):
+                pass
+            if last is not None:
+                return last
+    return None
+
+
+def extract_m3u_link_from_log(filepath):
+    """
+    Extracts the last m3u link echoed into a UI.Vision log, caching the result
+    by (path, size, mtime) so repeated calls on an unchanged log are free.
+    """
+    stat = os.stat(filepath)
+    key = (filepath, stat.st_size, stat.st_mtime_ns)
+    if key in _link_cache:
+        return _link_cache[key]
+
+    match = find_last_match(filepath, M3U_LINK_RE)
+    link = match.group(1).decode('utf-8', 'replace') if match else None
+    _link_cache.clear()
+    _link_cache[key] = link
+    return link
+
+
 def extract_m3u_link_from_latest_logs(delete_older=True):
     """
     Gets the latest logs*.txt file from Downloads folder,
     extracts the m3u link, and optionally deletes older files.
-    
+
+    The log is read from the end, since 'savelog' appends and the newest link
+    is the last one in the file.
+
     Args:
         delete_older (bool): Whether to delete older logs files
-        
+
     Returns:
         str or None: The extracted m3u link or None if not found
     """
-    downloads_folder = os.path.join(os.path.expanduser("~"), "Downloads")
-    pattern = os.path.join(downloads_folder, "iptvlogs*.txt")
-
-    files = glob.glob(pattern)
-    if not files:
+    latest_file = find_newest_file(LOGS_FOLDER, LOG_PATTERN)
+    if latest_file is None:
         return None
 
-    # Sort files by modification time (newest first)
-    sorted_files = sorted(files, key=os.path.getmtime, reverse=True)
-    latest_file = sorted_files[0]
-
     if delete_older:
-        delete_older_files(pattern, keep=1)
+        delete_older_files(os.path.join(LOGS_FOLDER, LOG_PATTERN), keep=1)
 
     try:
-        with open(latest_file, 'r') as file:
-            content = file.read()
-
-        match = re.search(r'\[echo\] m3uLink = (http[^\s]+)', content)
-        if match:
-            return match.group(1)
+        return extract_m3u_link_from_log(latest_file)
     except Exception:
         pass
 
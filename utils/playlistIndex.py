@@ -0,0 +1,216 @@
+import io
+import re
+import json
+import struct
+import hashlib
+from array import array
+
+from utils.atomicFile import atomic_write
+
+INDEX_SUFFIX = ".idx"
+INDEX_MAGIC = b"M3UIDX1\n"
+
+GROUP_TITLE_RE = re.compile(rb'group-title="([^"]*)"', re.IGNORECASE)
+TVG_ID_RE = re.compile(rb'tvg-id="([^"]*)"', re.IGNORECASE)
+
+
+def _display_name(extinf):
+    # '#EXTINF:-1 tvg-id="..." group-title="...",Display Name'
+    attributes_end = extinf.rfind(b'"')
+    comma = extinf.find(b',', attributes_end + 1 if attributes_end != -1 else 0)
+    return extinf[comma + 1:].strip() if comma != -1 else b''
+
+
+def _group_members(keys):
+    """
+    Turns one key per entry into ({key: (start, count)}, member array), where
+    members[start:start + count] are that key's entry ids, in playlist order.
+    """
+    members_by_key = {}
+    for entry_id, key in enumerate(keys):
+        if key is not None:
+            members_by_key.setdefault(key, []).append(entry_id)
+
+    ranges = {}
+    members = array('I')
+    for key in sorted(members_by_key):
+        ranges[key] = (len(members), len(members_by_key[key]))
+        members.extend(members_by_key[key])
+    return ranges, members
+
+
+class PlaylistIndex:
+    """
+    Byte offsets of every entry in an output playlist, grouped by group-title and
+    by tvg-id, so a subset can be served by slicing the playlist bytes without
+    parsing them.
+    """
+    __slots__ = ('source_digest', 'preamble_end', 'spans', 'names', '_lowered_names',
+                 'group_ranges', 'group_members', 'tvg_ranges', 'tvg_members')
+
+    def __init__(self, source_digest, preamble_end, spans, names, group_ranges, group_members,
+                 tvg_ranges, tvg_members):
+        self.source_digest = source_digest
+        self.preamble_end = preamble_end
+        self.spans = spans                  # array('Q'): start0, end0, start1, end1, ...
+        self.names = names
+        self._lowered_names = None
+        self.group_ranges = group_ranges    # {group-title: (start, count)} into group_members
+        self.group_members = group_members  # array('I') of entry ids
+        self.tvg_ranges = tvg_ranges
+        self.tvg_members = tvg_members
+
+    def __len__(self):
+        return len(self.spans) // 2
+
+    @classmethod
+    def build(cls, lines):
+        """
+        Scans an M3U playlist, given as an iterable of raw byte lines, in one pass.
+        """
+        hasher = hashlib.blake2b(digest_size=16)
+        spans = array('Q')
+        names, groups, tvg_ids = [], [], []
+        preamble_end = None
+        offset = 0
+        entry_start = None
+        pending = None
+
+        for line in lines:
+            hasher.update(line)
+            line_start = offset
+            offset += len(line)
+            stripped = line.strip()
+            if not stripped:
+                continue
+
+            if stripped.startswith(b"#EXTINF:"):
+                if preamble_end is None:
+                    preamble_end = line_start
+                entry_start = line_start
+                pending = stripped
+            elif entry_start is not None and not stripped.startswith(b"#"):
+                # The URL line closes the entry
+                spans.append(entry_start)
+                spans.append(offset)
+                group_match = GROUP_TITLE_RE.search(pending)
+                tvg_match = TVG_ID_RE.search(pending)
+                groups.append(group_match.group(1).decode('utf-8', 'replace') if group_match else None)
+                tvg_ids.append(tvg_match.group(1).decode('utf-8', 'replace') if tvg_match and tvg_match.group(1) else None)
+                names.append(_display_name(pending).decode('utf-8', 'replace'))
+                entry_start = None
+
+        group_ranges, group_members = _group_members(groups)
+        tvg_ranges, tvg_members = _group_members(tvg_ids)
+        return cls(hasher.hexdigest(), preamble_end if preamble_end is not None else offset, spans, names,
+                   group_ranges, group_members, tvg_ranges, tvg_members)
+
+    @classmethod
+    def build_from_bytes(cls, body):
+        return cls.build(io.BytesIO(body))
+
+    def save(self, index_filepath):
+        """
+        Writes the index as: magic, a length-prefixed JSON header (digest, names,
+        group and tvg-id ranges), then the raw span and member arrays.
+        """
+        header = json.dumps({
+            'source_digest': self.source_digest,
+            'preamble_end': self.preamble_end,
+            'entries': len(self),
+            'names': self.names,
+            'groups': [[name, start, count] for name, (start, count) in self.group_ranges.items()],
+            'group_members': len(self.group_members),
+            'tvg_ids': [[tvg_id, start, count] for tvg_id, (start, count) in self.tvg_ranges.items()],
+            'tvg_members': len(self.tvg_members),
+        }, ensure_ascii=False).encode('utf-8')
+
+        with atomic_write(index_filepath, 'wb') as index_file:
+            index_file.write(INDEX_MAGIC)
+            index_file.write(struct.pack('<Q', len(header)))
+            index_file.write(header)
+            self.spans.tofile(index_file)
+            self.group_members.tofile(index_file)
+            self.tvg_members.tofile(index_file)
+
+    @classmethod
+    def load(cls, index_filepath):
+        with open(index_filepath, 'rb') as index_file:
+            if index_file.read(len(INDEX_MAGIC)) != INDEX_MAGIC:
+                raise ValueError(f"'{index_filepath}' is not a playlist index")
+            header_length, = struct.unpack('<Q', index_file.read(8))
+            header = json.loads(index_file.read(header_length).decode('utf-8'))
+
+            spans = array('Q')
+            spans.fromfile(index_file, header['entries'] * 2)
+            group_members = array('I')
+            group_members.fromfile(index_file, header['group_members'])
+            tvg_members = array('I')
+            tvg_members.fromfile(index_file, header['tvg_members'])
+
+        return cls(header['source_digest'], header['preamble_end'], spans, header['names'],
+                   {name: (start, count) for name, start, count in header['groups']}, group_members,
+                   {tvg_id: (start, count) for tvg_id, start, count in header['tvg_ids']}, tvg_members)
+
+    def group_entries(self, group_title):
+        start, count = self.group_ranges.get(group_title, (0, 0))
+        return self.group_members[start:start + count]
+
+    def tvg_entries(self, tvg_id):
+        start, count = self.tvg_ranges.get(tvg_id, (0, 0))
+        return self.tvg_members[start:start + count]
+
+    def search(self, query):
+        """
+        Ids of the entries whose display name contains 'query' (case-insensitive).
+        """
+        if self._lowered_names is None:
+            self._lowered_names = [name.lower() for name in self.names]
+        query = query.lower()
+        return [entry_id for entry_id, name in enumerate(self._lowered_names) if query in name]
+
+    def slices(self, body, entry_ids):
+        """
+        Zero-copy views of the playlist header and the given entries within 'body'.
+        Entries that sit back to back in the playlist come out as one view.
+        """
+        view = memoryview(body)
+        yield view[:self.preamble_end]
+        spans = self.spans
+        run_start = run_end = None
+        for entry_id in entry_ids:
+            start = spans[2 * entry_id]
+            if start != run_end:
+                if run_start is not None:
+                    yield view[run_start:run_end]
+                run_start = start
+            run_end = spans[2 * entry_id + 1]
+        if run_start is not None:
+            yield view[run_start:run_end]
+
+
+def write_index(m3u_filepath, index_filepath=None):
+    """
+    Builds the index for an output playlist and saves it next to it.
+
+    Returns:
+        PlaylistIndex: The index that was written.
+    """
+    with open(m3u_filepath, 'rb') as m3u_file:
+        index = PlaylistIndex.build(m3u_file)
+    index.save(index_filepath or m3u_filepath + INDEX_SUFFIX)
+    return index
+
+
+def load_index(m3u_filepath, body, source_digest):
+    """
+    Returns the saved index for a playlist if it matches 'source_digest' (the
+    blake2b-128 hex digest of the playlist bytes); otherwise builds one from 'body'.
+    """
+    try:
+        index = PlaylistIndex.load(m3u_filepath + INDEX_SUFFIX)
+        if index.source_digest == source_digest:
+            return index
+    except (OSError, ValueError, EOFError, KeyError):
+        pass
+    return PlaylistIndex.build_from_bytes(body)
@@ -0,0 +1,152 @@
+import os
+import json
+import threading
+from itertools import compress
+from collections import OrderedDict
+
+from utils.declutterPlaylist import BlacklistMatcher
+
+DEFAULT_PROFILES_FILE = "profiles.json"
+
+# Query parameters that ask for a filtered view of the playlist
+VIEW_PARAMS = ('exclude', 'include_group', 'profile')
+
+
+def _split(values):
+    # ['FR,DE', 'IT'] or 'FR,DE' -> ['FR', 'DE', 'IT']
+    if isinstance(values, str):
+        values = [values]
+    return [part.strip() for value in values for part in value.split(',') if part.strip()]
+
+
+class ViewFilter:
+    """
+    Which groups one client sees: groups whose group-title contains any 'exclude'
+    substring are dropped and, if 'include_group' is given, only groups whose
+    group-title contains one of those are kept (both case-insensitive, like the
+    blacklist). Entries without a group-title are kept unless 'include_group' is set.
+    """
+    __slots__ = ('exclude', 'include_group', 'key', '_exclude', '_include')
+
+    def __init__(self, exclude=(), include_group=()):
+        self.exclude = tuple(sorted({value.lower() for value in exclude if value}))
+        self.include_group = tuple(sorted({value.lower() for value in include_group if value}))
+        # Equal filters share a key however they were spelled, so they share a cached view
+        self.key = (self.exclude, self.include_group)
+        self._exclude = BlacklistMatcher(self.exclude)
+        self._include = BlacklistMatcher(self.include_group)
+
+    def keeps(self, group_title_value):
+        if group_title_value is None:
+            return not self.include_group
+        if self._exclude.is_blacklisted(group_title_value):
+            return False
+        return not self.include_group or self._include.is_blacklisted(group_title_value)
+
+
+def select_entries(index, view):
+    """
+    Ids of the entries a view keeps, in playlist order. Decided once per group
+    from the PlaylistIndex, so no entry is parsed again.
+    """
+    ungrouped_kept = view.keeps(None)
+    keep = bytearray([ungrouped_kept]) * len(index)
+    for group_title_value, (start, count) in index.group_ranges.items():
+        # Only groups whose verdict differs from the default need their members touched
+        if view.keeps(group_title_value) != ungrouped_kept:
+            verdict = not ungrouped_kept
+            for entry_id in index.group_members[start:start + count]:
+                keep[entry_id] = verdict
+    return list(compress(range(len(index)), keep))
+
+
+class ProfileStore:
+    """
+    Named view profiles from a JSON file, e.g.
+
+        {"kids-room": {"exclude": ["FR", "DE"], "include_group": ["Kids"]}}
+
+    re-read whenever the file changes, so adding a profile needs no restart.
+    """
+    def __init__(self, filepath=DEFAULT_PROFILES_FILE):
+        self.filepath = filepath
+        self._profiles = {}
+        self._mtime = None
+        self._lock = threading.Lock()
+
+    def get(self):
+        try:
+            mtime = os.stat(self.filepath).st_mtime_ns
+        except FileNotFoundError:
+            return {}
+        with self._lock:
+            if mtime != self._mtime:
+                try:
+                    with open(self.filepath, 'r', encoding='utf-8') as profiles_file:
+                        self._profiles = json.load(profiles_file)
+                except ValueError as e:
+                    print(f"Warning: could not read profiles from '{self.filepath}': {e}")
+                    self._profiles = {}
+                self._mtime = mtime
+            return self._profiles
+
+
+def view_from_query(query, profiles):
+    """
+    Builds the ViewFilter for a request from its parsed query string
+    ({name: [values]}), merging in any named profiles it asks for.
+
+    Returns:
+        ViewFilter or None: None if the query asks for no filtering.
+    Raises:
+        KeyError: If a requested profile does not exist.
+    """
+    if not any(param in query for param in VIEW_PARAMS):
+        return None
+    exclude = _split(query.get('exclude', []))
+    include_group = _split(query.get('include_group', []))
+    for name in _split(query.get('profile', [])):
+        profile = profiles[name]
+        exclude += _split(profile.get('exclude', []))
+        include_group += _split(profile.get('include_group', []))
+    return ViewFilter(exclude, include_group)
+
+
+class ViewCache:
+    """
+    Rendered views of the current playlist snapshot, least recently used
+    evicted first. Everything is dropped as soon as a new snapshot is asked for.
+    """
+    def __init__(self, max_views=32):
+        self.max_views = max_views
+        self.stats = {'hits': 0, 'misses': 0, 'evictions': 0}
+        self._snapshot = None
+        self._views = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, snapshot, view, render):
+        """
+        Returns the cached rendering of 'view' over 'snapshot', calling
+        render() to build it on a miss.
+        """
+        with self._lock:
+            if snapshot is not self._snapshot:
+                self._snapshot = snapshot
+                self._views.clear()
+            rendered = self._views.get(view.key)
+            if rendered is not None:
+                self._views.move_to_end(view.key)
+                self.stats['hits'] += 1
+                return rendered
+            self.stats['misses'] += 1
+
+        # Rendered outside the lock so a slow view doesn't hold up cached ones
+        rendered = render()
+        with self._lock:
+            if snapshot is self._snapshot:
+                self._views[view.key] = rendered
+                self._views.move_to_end(view.key)
+                while len(self._views) > self.max_views:
+                    self._views.popitem(last=False)
+                    self.stats['evictions'] += 1
+        return rendered
@@ -0,0 +1,174 @@
+# python -m utils.providerStandIn --port 8090 --entries 10000
+import re
+import json
+import time
+import hashlib
+import argparse
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlsplit, parse_qs
+
+from utils.syntheticPlaylist import DEFAULT_LANGUAGES, DEFAULT_CATEGORIES
+
+STREAM_PATH_RE = re.compile(r'^/(?:live|movie|series)/[^/]+/[^/]+/(\d+)\.\w+$')
+
+
+class StandInConfig:
+    """
+    What the stand-in provider serves. Every 'dead_every'-th stream id answers 404.
+    'requests' counts every request, 'stream_requests' the stream ones, and
+    'max_streams_in_flight' the most stream requests it was answering at once.
+    """
+    def __init__(self, entries=1000, dead_every=5, stream_delay=0.0, playlist=None, epg=None, account_active=True):
+        self.entries = entries
+        self.account_active = account_active
+        self.dead_every = dead_every
+        self.stream_delay = stream_delay
+        self.playlist = playlist
+        self.epg = epg
+        self.requests = 0
+        self.stream_requests = 0
+        self.streams_in_flight = 0
+        self.max_streams_in_flight = 0
+        self.lock = threading.Lock()
+
+
+def render_playlist(base_url, entries, username="user", password="pass"):
+    """
+    Builds a synthetic Xtream-style playlist whose stream URLs point back at the stand-in.
+    """
+    groups = [f"{lang}| {category}" for lang in DEFAULT_LANGUAGES for category in DEFAULT_CATEGORIES]
+    lines = ["#EXTM3U\n"]
+    for stream_id in range(1, entries + 1):
+        group = groups[stream_id % len(groups)]
+        name = f"{group.split('|')[0]}: Channel {stream_id}"
+        lines.append(f'#EXTINF:-1 tvg-id="ch{stream_id}" tvg-name="{name}" group-title="{group}",{name}\n')
+        lines.append(f"{base_url}/live/{username}/{password}/{stream_id}.ts\n")
+    return "".join(lines).encode('utf-8')
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    """
+    A local stand-in for an IPTV provider: serves a playlist at /get.php (with
+    ETag and Range support), account info at /player_api.php, an XMLTV guide
+    at /xmltv.php, and stream URLs that are either alive or dead.
+    """
+    protocol_version = 'HTTP/1.1'
+    config = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_bytes(self, body, content_type, filename=None):
+        etag = '"' + hashlib.blake2b(body, digest_size=8).hexdigest() + '"'
+        if self.headers.get('If-None-Match') == etag:
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+
+        start, end = 0, len(body)
+        range_header = self.headers.get('Range')
+        match = re.match(r'bytes=(\d+)-(\d*)$', range_header or '')
+        if match and (self.headers.get('If-Range') in (None, etag)):
+            start = int(match.group(1))
+            end = int(match.group(2)) + 1 if match.group(2) else len(body)
+            self.send_response(206)
+            self.send_header('Content-Range', f'bytes {start}-{end - 1}/{len(body)}')
+        else:
+            self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(end - start))
+        self.send_header('Accept-Ranges', 'bytes')
+        self.send_header('ETag', etag)
+        if filename:
+            self.send_header('Content-Disposition', f'attachment; filename="{filename}"')
+        self.end_headers()
+        if self.command != 'HEAD':
+            self.wfile.write(body[start:end])
+
+    def do_GET(self):
+        config = self.config
+        config.requests += 1
+        url = urlsplit(self.path)
+
+        if url.path == '/get.php':
+            if config.playlist is None:
+                base_url = f"http://{self.headers.get('Host')}"
+                config.playlist = render_playlist(base_url, config.entries)
+            username = parse_qs(url.query).get('username', ['user'])[0]
+            self.send_bytes(config.playlist, 'application/x-mpegurl', f'tv_channels_{username}_plus.m3u')
+            return
+
+        if url.path == '/player_api.php':
+            user_info = {
+                'auth': 1 if config.account_active else 0,
+                'status': 'Active' if config.account_active else 'Expired',
+                'exp_date': str(int(time.time()) + 7 * 24 * 3600),
+            }
+            self.send_bytes(json.dumps({'user_info': user_info}).encode('utf-8'), 'application/json')
+            return
+
+        if url.path == '/xmltv.php' and config.epg is not None:
+            self.send_bytes(config.epg, 'application/xml')
+            return
+
+        match = STREAM_PATH_RE.match(url.path)
+        if match:
+            with config.lock:
+                config.stream_requests += 1
+                config.streams_in_flight += 1
+                config.max_streams_in_flight = max(config.max_streams_in_flight, config.streams_in_flight)
+            try:
+                self.send_stream(config, int(match.group(1)))
+            finally:
+                with config.lock:
+                    config.streams_in_flight -= 1
+            return
+
+        self.send_error(404)
+
+    def send_stream(self, config, stream_id):
+        if config.stream_delay:
+            time.sleep(config.stream_delay)
+        if config.dead_every and stream_id % config.dead_every == 0:
+            self.send_error(404)
+            return
+        self.send_bytes(b'\x47' * 188 * 64, 'video/mp2t')
+
+    def do_HEAD(self):
+        self.do_GET()
+
+
+def start_stand_in(port=0, config=None):
+    """
+    Starts the stand-in provider on a background thread.
+
+    Returns:
+        tuple: (server, base_url). Call server.shutdown() when done.
+    """
+    handler = type('ConfiguredStandInHandler', (StandInHandler,), {'config': config or StandInConfig()})
+    server = ThreadingHTTPServer(('127.0.0.1', port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a local stand-in IPTV provider for testing and benchmarks.")
+    parser.add_argument("--port", type=int, default=8090, help="Port to listen on (default: 8090)")
+    parser.add_argument("--entries", type=int, default=1000, help="Channels in the playlist (default: 1000)")
+    parser.add_argument("--dead-every", type=int, default=5, help="Every Nth stream is dead (default: 5, 0 for none)")
+
+    args = parser.parse_args()
+
+    server, base_url = start_stand_in(args.port, StandInConfig(args.entries, args.dead_every))
+    print(f"Stand-in provider at {base_url}/get.php?username=user&password=pass")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+if __name__ == "__main__":
+    main()
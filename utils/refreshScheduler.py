@@ -0,0 +1,109 @@
+import threading
+import time
+
+
+class RefreshScheduler:
+    """
+    Runs the refresh pipeline in the background.
+
+    Concurrent triggers are collapsed into the single in-flight run, so the UI
+    automation, download and declutter never run twice over the same files.
+    Optionally refreshes on a fixed interval as well.
+    """
+    def __init__(self, refresh_fn, interval=None):
+        """
+        Args:
+            refresh_fn (callable): The refresh to run; a falsy return value counts as a failure.
+            interval (float, optional): Seconds between scheduled refreshes. None disables them.
+        """
+        self.refresh_fn = refresh_fn
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._running = None
+        self._stop = threading.Event()
+        self._timer_thread = None
+        self._state = {
+            'state': 'idle',
+            'runs': 0,
+            'coalesced': 0,
+            'last_started': None,
+            'last_finished': None,
+            'last_duration': None,
+            'last_result': None,
+            'last_error': None,
+            'next_scheduled': None,
+        }
+
+    def trigger(self):
+        """
+        Starts a refresh unless one is already running.
+
+        Returns:
+            bool: True if a new refresh was started, False if it joined the one in flight.
+        """
+        with self._lock:
+            if self._running is not None:
+                self._state['coalesced'] += 1
+                return False
+            self._state['state'] = 'running'
+            self._state['last_started'] = time.time()
+            self._running = threading.Thread(target=self._run, name='playlist-refresh', daemon=True)
+            self._running.start()
+            return True
+
+    def wait(self, timeout=None):
+        """
+        Blocks until the in-flight refresh (if any) finishes.
+        """
+        running = self._running
+        if running is not None:
+            running.join(timeout)
+
+    def status(self):
+        with self._lock:
+            return dict(self._state)
+
+    def _run(self):
+        result, error = None, None
+        started = time.perf_counter()
+        try:
+            result = 'ok' if self.refresh_fn() else 'failed'
+        except Exception as e:
+            result, error = 'error', str(e)
+            print(f"Refresh failed: {e}")
+        finally:
+            with self._lock:
+                self._state.update({
+                    'state': 'idle',
+                    'runs': self._state['runs'] + 1,
+                    'last_finished': time.time(),
+                    'last_duration': time.perf_counter() - started,
+                    'last_result': result,
+                    'last_error': error,
+                })
+                self._running = None
+
+    def start(self):
+        """
+        Starts the periodic refresh timer, if an interval was given.
+        """
+        if not self.interval or self._timer_thread is not None:
+            return
+        self._stop.clear()
+        self._timer_thread = threading.Thread(target=self._schedule_loop, name='refresh-timer', daemon=True)
+        self._timer_thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._timer_thread is not None:
+            self._timer_thread.join()
+            self._timer_thread = None
+
+    def _schedule_loop(self):
+        while True:
+            with self._lock:
+                self._state['next_scheduled'] = time.time() + self.interval
+            if self._stop.wait(self.interval):
+                return
+            if not self.trigger():
+                print("Scheduled refresh skipped, a refresh is already running")
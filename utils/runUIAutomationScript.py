@@ -1,49 +1,175 @@
+import os
+import time
+import signal
+import asyncio
+import logging
 import subprocess
+from logging.handlers import RotatingFileHandler
 
-def run_ui_automation_script(openInPrivate = False):
-    # Define the path to Firefox executable and the URL as separate strings
-    firefox_exe_path = r"C:\Program Files\Mozilla Firefox\firefox.exe"
-    # Using a raw string (r"...") is good practice for Windows paths to avoid issues with backslashes
-    # The URL is treated as a single argument
-    target_url = r"file:///C:\Users\rainbow\Desktop\scripts\iptv\ui.vision.html?direct=1&macro=iptv/freeiptv2023&savelog=iptvlogs.txt&closeBrowser=1"
+from utils.parsingFromLogs import LOGS_FOLDER, LOG_PATTERN, find_newest_file, extract_m3u_link_from_log
 
+# Define the path to Firefox executable and the URL as separate strings
+# Using a raw string (r"...") is good practice for Windows paths to avoid issues with backslashes
+FIREFOX_EXE_PATH = r"C:\Program Files\Mozilla Firefox\firefox.exe"
+# The URL is treated as a single argument
+TARGET_URL = r"file:///C:\Users\rainbow\Desktop\scripts\iptv\ui.vision.html?direct=1&macro=iptv/freeiptv2023&savelog=iptvlogs.txt&closeBrowser=1"
+
+DEFAULT_TIMEOUT = 180               # Seconds before a hung browser is killed
+LOG_POLL_INTERVAL = 0.5             # Seconds between checks of the logs folder
+AUTOMATION_LOG_FILE = os.path.join("logs", "ui_automation.log")
+_READ_CHUNK = 64 * 1024
+
+
+def _get_output_logger(log_filepath):
+    """
+    Browser stdout/stderr goes to a size-capped rotating file rather than into memory.
+    """
+    logger = logging.getLogger("ui_automation")
+    if not logger.handlers:
+        os.makedirs(os.path.dirname(os.path.abspath(log_filepath)), exist_ok=True)
+        handler = RotatingFileHandler(log_filepath, maxBytes=1024 * 1024, backupCount=3, encoding='utf-8')
+        handler.setFormatter(logging.Formatter("%(asctime)s %(message)s"))
+        logger.addHandler(handler)
+        logger.setLevel(logging.INFO)
+        logger.propagate = False
+    return logger
+
+
+async def _pump(stream, logger, label):
+    pending = b''
+    while True:
+        chunk = await stream.read(_READ_CHUNK)
+        if not chunk:
+            break
+        *lines, pending = (pending + chunk).split(b'\n')
+        for line in lines:
+            logger.info("%s %s", label, line.decode('utf-8', 'replace').rstrip())
+    if pending:
+        logger.info("%s %s", label, pending.decode('utf-8', 'replace').rstrip())
+
+
+async def _watch_for_link(logs_folder, log_pattern, started_ns):
+    """
+    Polls the logs folder until a log written since 'started_ns' holds an m3u link.
+    """
+    while True:
+        latest_file = find_newest_file(logs_folder, log_pattern, modified_after_ns=started_ns)
+        if latest_file is not None:
+            try:
+                link = extract_m3u_link_from_log(latest_file)
+            except OSError:
+                link = None
+            if link:
+                return link
+        await asyncio.sleep(LOG_POLL_INTERVAL)
+
+
+def _kill_process_tree(process):
+    """
+    Kills the browser and everything it spawned.
+    """
+    if os.name == 'nt':
+        if process.returncode is None:
+            subprocess.run(["taskkill", "/PID", str(process.pid), "/T", "/F"], capture_output=True)
+    else:
+        # The group outlives its leader: a launcher that has exited may have left the real browser in it
+        try:
+            os.killpg(process.pid, signal.SIGKILL)
+        except (ProcessLookupError, PermissionError):
+            pass
+
+
+async def run_ui_automation_async(command_list, timeout=DEFAULT_TIMEOUT, logs_folder=LOGS_FOLDER,
+                                  log_pattern=LOG_PATTERN, output_log_file=AUTOMATION_LOG_FILE):
+    """
+    Runs the automation command and returns as soon as its log shows an m3u link,
+    without waiting for the browser to exit.
+
+    The process gets its own process group, so on timeout, cancellation or success
+    the whole tree (browser and helpers) is killed. Its output is streamed to a
+    rotating log file. A launcher that exits cleanly may have handed off to an
+    already running browser, so the log is still watched until 'timeout'; after
+    a failed exit it only gets a short grace period.
+
+    Returns:
+        str or None: The m3u link, or None if the command finished or timed out without one.
+    """
+    logger = _get_output_logger(output_log_file)
+    started_ns = time.time_ns()
+    if os.name == 'nt':
+        spawn_options = {'creationflags': subprocess.CREATE_NEW_PROCESS_GROUP}
+    else:
+        spawn_options = {'start_new_session': True}
+
+    process = await asyncio.create_subprocess_exec(
+        *command_list, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE, **spawn_options)
+    logger.info("started pid %s: %s", process.pid, command_list)
+
+    pumps = [asyncio.ensure_future(_pump(process.stdout, logger, "[stdout]")),
+             asyncio.ensure_future(_pump(process.stderr, logger, "[stderr]"))]
+    watcher = asyncio.ensure_future(_watch_for_link(logs_folder, log_pattern, started_ns))
+    exited = asyncio.ensure_future(process.wait())
+    deadline = time.monotonic() + timeout
     try:
-        # Construct the command as a list of strings
-        # The first element is the executable, subsequent elements are arguments
-        command_list = [firefox_exe_path, target_url]
+        done, _ = await asyncio.wait([watcher, exited], timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+        if watcher in done:
+            return watcher.result()
+        if exited in done:
+            logger.info("exited with code %s", process.returncode)
+            print(f"Command exited with code {process.returncode}")
+            if process.returncode == 0:
+                # Firefox's launcher exits once it hands the URL to a running browser;
+                # the macro's log is written after that
+                remaining = max(0.0, deadline - time.monotonic())
+            else:
+                # The log may land just after the browser closes
+                remaining = LOG_POLL_INTERVAL * 4
+            try:
+                return await asyncio.wait_for(watcher, remaining)
+            except asyncio.TimeoutError:
+                if process.returncode != 0:
+                    return None
+        print(f"Error: automation did not produce an m3u link within {timeout}s, killing it")
+        logger.info("timed out after %ss", timeout)
+        return None
+    finally:
+        watcher.cancel()
+        _kill_process_tree(process)
+        await exited
+        for pump in pumps:
+            pump.cancel()
+        await asyncio.gather(*pumps, return_exceptions=True)
+
+
+def run_ui_automation_script(openInPrivate = False, timeout = DEFAULT_TIMEOUT, command_list = None):
+    """
+    Launches the UI.Vision macro in Firefox and waits (up to 'timeout' seconds)
+    for the m3u link to show up in its log.
+
+    Args:
+        command_list (list, optional): Command to run instead of Firefox, e.g. a fake for testing.
+
+    Returns:
+        str or None: The m3u link, if it was seen before the timeout.
+    """
+    # Construct the command as a list of strings
+    # The first element is the executable, subsequent elements are arguments
+    if command_list is None:
+        # -wait-for-browser keeps the launcher alive until the browser it starts exits,
+        # so the timeout can kill the real browser's process tree
+        command_list = [FIREFOX_EXE_PATH, "-wait-for-browser", TARGET_URL]
         if openInPrivate:
-            command_list = [firefox_exe_path,"-private-window",target_url]
-
-        print(f"Attempting to execute: {command_list}")
-
-        # Run the command and wait for it to complete.
-        # check=True will raise a CalledProcessError if the command returns a non-zero exit code.
-        # capture_output=True and text=True are good for debugging but might not be necessary
-        # for launching a browser where output is usually not captured by the script.
-        # If Firefox launches and stays open, the Python script will wait until Firefox is closed
-        # (or until the specific tab opened by the command is closed, depending on Firefox's behavior).
-        # If closeBrowser=0 in your URL means Firefox should stay open, then your Python script
-        # will wait indefinitely until that Firefox process closes.
-        result = subprocess.run(
-            command_list,
-            check=True,
-            capture_output=True, # Captures stdout and stderr
-            text=True            # Decodes output as text (UTF-8 by default)
-        )
-
-        print(f"Command executed successfully. Return code: {result.returncode}")
-        if result.stdout:
-            print("STDOUT:\n", result.stdout)
-        if result.stderr:
-            print("STDERR:\n", result.stderr)
+            command_list = [FIREFOX_EXE_PATH, "-wait-for-browser", "-private-window", TARGET_URL]
 
+    print(f"Attempting to execute: {command_list}")
+
+    try:
+        m3u_link = asyncio.run(run_ui_automation_async(command_list, timeout))
+        print(f"Automation finished, {'found' if m3u_link else 'no'} m3u link")
+        return m3u_link
     except FileNotFoundError:
-        print(f"Error: The executable '{firefox_exe_path}' was not found.")
+        print(f"Error: The executable '{command_list[0]}' was not found.")
         print("Please ensure Firefox is installed at the specified path.")
-    except subprocess.CalledProcessError as e:
-        print(f"Error: Command failed with exit code {e.returncode}")
-        print(f"STDOUT:\n{e.stdout}")
-        print(f"STDERR:\n{e.stderr}")
     except Exception as e:
         print(f"An unexpected error occurred: {e}")
 
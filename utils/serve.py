@@ -1,69 +1,555 @@
 # python serve.py --file output.m3u --port 8000
-from http.server import HTTPServer, BaseHTTPRequestHandler
+from http.server import HTTPServer, ThreadingHTTPServer, BaseHTTPRequestHandler
+from email.utils import formatdate, parsedate_to_datetime
 import argparse
+import gzip
+import hashlib
+import json
+import os
+import threading
+import time
+from urllib.parse import urlsplit, parse_qs, unquote
 from utils.driver import driver
+from utils.epgSubset import EPG_OUTPUT
+from utils.metrics import registry, observe_request, profiled
+from utils.playlistIndex import load_index
+from utils.playlistViews import (DEFAULT_PROFILES_FILE, VIEW_PARAMS, ProfileStore, ViewCache, select_entries,
+                                 view_from_query)
+from utils.refreshScheduler import RefreshScheduler
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+SERVER_MODES = {
+    'single': HTTPServer,
+    'threaded': ThreadingHTTPServer,
+}
+
+# Content codings the server can produce, preferred in this order when the client weighs them equally.
+# Each runs once per playlist version, so the levels favour size over speed without going to the slowest.
+ENCODERS = {}
+if brotli is not None:
+    ENCODERS['br'] = lambda body: brotli.compress(body, quality=7)
+if zstandard is not None:
+    ENCODERS['zstd'] = lambda body: zstandard.ZstdCompressor(level=12).compress(body)
+ENCODERS['gzip'] = lambda body: gzip.compress(body, compresslevel=6, mtime=0)
+
+
+class PlaylistVersion:
+    """
+    One loaded version of the playlist file: the bytes to serve, their
+    compressed variants (built on first use), and the validators derived from them.
+    """
+    __slots__ = ('key', 'body', 'file', 'digest', 'etag', 'last_modified', 'mtime', 'index', '_encoded', '_lock')
+
+    def __init__(self, key, body, mtime, file=None):
+        self.key = key
+        self.body = body
+        # Open on the inode these bytes were read from, for sendfile; the playlist is
+        # replaced atomically, so it keeps pointing at this version until it's dropped
+        self.file = file
+        # Content-based, so a refresh that produces the same playlist keeps clients' caches valid
+        self.digest = hashlib.blake2b(body, digest_size=16).hexdigest()
+        self.etag = '"' + self.digest + '"'
+        self.last_modified = formatdate(mtime, usegmt=True)
+        self.mtime = int(mtime)
+        self.index = None
+        self._encoded = {}
+        self._lock = threading.Lock()
+
+    def encoded(self, coding):
+        """
+        The body in the given content coding, compressed once and then reused.
+        """
+        body = self._encoded.get(coding)
+        if body is None:
+            with self._lock:
+                body = self._encoded.get(coding)
+                if body is None:
+                    body = self._encoded[coding] = ENCODERS[coding](self.body)
+        return body
+
+    def etag_for(self, coding):
+        # Each representation gets its own strong ETag, as a compressed body is different bytes
+        return self.etag if coding is None else f'"{self.digest}-{coding}"'
+
+    def matches_etag(self, tag):
+        """
+        True if an entity tag names any representation of this version.
+        """
+        if tag.startswith('W/'):
+            tag = tag[2:]
+        return tag == self.etag or tag.startswith(f'"{self.digest}-')
+
+
+class PlaylistCache:
+    """
+    Keeps a served file (the playlist, or the guide) in memory and reloads it
+    only when the file's mtime, inode or size changes.
+    """
+    def __init__(self, filepath):
+        self.filepath = filepath
+        self._version = None
+        self._lock = threading.Lock()
+
+    def get(self):
+        """
+        Returns the current PlaylistVersion, reloading it if the file changed.
+        Raises FileNotFoundError if the file does not exist.
+        """
+        stat = os.stat(self.filepath)
+        key = (stat.st_mtime_ns, stat.st_ino, stat.st_size)
+        version = self._version
+        if version is not None and version.key == key:
+            return version
+
+        with self._lock:
+            version = self._version
+            if version is None or version.key != key:
+                version = self._version = self._load()
+        return version
+
+    def _load(self):
+        file = open(self.filepath, 'rb', buffering=0)
+        try:
+            stat = os.fstat(file.fileno())
+            body = file.readall()
+        except BaseException:
+            file.close()
+            raise
+        # Windows can't replace a file that is held open, and has no sendfile to use it for anyway
+        if not hasattr(os, 'sendfile'):
+            file.close()
+            file = None
+        return PlaylistVersion((stat.st_mtime_ns, stat.st_ino, stat.st_size), body, stat.st_mtime, file)
+
+    def get_index(self, version):
+        """
+        Returns the PlaylistIndex for a version, loading the one saved next to the
+        playlist or, if that is missing or stale, building it from the cached bytes.
+        """
+        if version.index is None:
+            with self._lock:
+                if version.index is None:
+                    version.index = load_index(self.filepath, version.body, version.digest)
+        return version.index
+
+
+def default_epg_file(m3u_file):
+    # The driver writes the trimmed guide next to the output playlist
+    return os.path.join(os.path.dirname(m3u_file), os.path.basename(EPG_OUTPUT))
+
+
+# Shared by handlers that aren't given their own, so /refresh stays single-flight
+default_refresh_scheduler = RefreshScheduler(lambda: driver(True))
+
+
+def parse_accept_encoding(accept_encoding):
+    """
+    Parses an Accept-Encoding header value into {coding: q}.
+    """
+    codings = {}
+    for coding in (accept_encoding or '').split(','):
+        name, *params = [part.strip() for part in coding.split(';')]
+        if not name:
+            continue
+        q = 1.0
+        for param in params:
+            if param.lower().startswith('q='):
+                try:
+                    q = float(param[2:])
+                except ValueError:
+                    q = 0.0
+        codings[name.lower()] = q
+    return codings
+
+
+def route_for(path):
+    """
+    The route a request path is served by, also used as its metrics label.
+    """
+    if path.startswith('/group/') and path.endswith('.m3u'):
+        return 'group'
+    if path.startswith('/tvg/') and path.endswith('.m3u'):
+        return 'tvg'
+    if path.startswith('/profile/') and path.endswith('.m3u'):
+        return 'profile'
+    if path in ('/search', '/refresh', '/refresh/status', '/metrics'):
+        return path[1:]
+    if path == '/epg.xml.gz':
+        return 'epg'
+    return 'playlist'
+
+
+def negotiate_encoding(accept_encoding, available=None):
+    """
+    Picks the content coding for a response from an Accept-Encoding header value.
+
+    Returns:
+        str or None: A key of ENCODERS, or None to send the body as is.
+    """
+    if not accept_encoding:
+        return None
+    codings = parse_accept_encoding(accept_encoding)
+    best, best_q = None, 0.0
+    for coding in (available if available is not None else ENCODERS):
+        q = codings.get(coding, codings.get('*', 0.0))
+        if q > best_q:
+            best, best_q = coding, q
+    if best is not None and codings.get('identity', 0.0) > best_q:
+        return None
+    return best
+
+
+def parse_range(range_header, size):
+    """
+    Parses a single-range 'bytes=' Range header value against a body of 'size' bytes.
+
+    Returns:
+        tuple or None: (start, end), end exclusive, or None if the header should be
+        ignored and the whole body sent (malformed, or several ranges).
+    Raises:
+        ValueError: If the range lies outside the body.
+    """
+    unit, _, ranges = range_header.partition('=')
+    if unit.strip().lower() != 'bytes' or ',' in ranges:
+        return None
+    first, dash, last = ranges.strip().partition('-')
+    if not dash or not (first + last).isdigit():
+        return None
+
+    if not first:
+        # 'bytes=-500' is the last 500 bytes
+        length = int(last)
+        if length == 0 or size == 0:
+            raise ValueError(range_header)
+        return max(size - length, 0), size
+
+    start = int(first)
+    if last and int(last) < start:
+        return None
+    if start >= size:
+        raise ValueError(range_header)
+    return start, min(int(last) + 1, size) if last else size
+
 
 class M3UHandler(BaseHTTPRequestHandler):
-    def __init__(self, m3u_file, *args, **kwargs):
+    # HTTP/1.1 so players can keep the connection alive between polls
+    protocol_version = 'HTTP/1.1'
+
+    def __init__(self, m3u_file, *args, playlist_cache=None, refresh_scheduler=None, view_cache=None,
+                 profile_store=None, epg_cache=None, **kwargs):
         self.m3u_file = m3u_file
+        self.playlist_cache = playlist_cache if playlist_cache is not None else PlaylistCache(m3u_file)
+        self.epg_cache = epg_cache if epg_cache is not None else PlaylistCache(default_epg_file(m3u_file))
+        self.refresh_scheduler = refresh_scheduler if refresh_scheduler is not None else default_refresh_scheduler
+        self.view_cache = view_cache if view_cache is not None else ViewCache()
+        self.profile_store = profile_store if profile_store is not None else ProfileStore()
         super().__init__(*args, **kwargs)
 
-    def do_GET(self):
+    def send_response(self, code, message=None):
+        self.status_code = code
+        super().send_response(code, message)
+
+    def send_text(self, status, body, content_type='text/plain'):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        if self.command != 'HEAD':
+            self.wfile.write(body)
+
+    def send_json(self, status, payload):
+        self.send_text(status, json.dumps(payload).encode('utf-8'), 'application/json')
+
+    def is_not_modified(self, version, etag=None):
+        """
+        True if the client's copy is current: it names one of this version's
+        representations (or exactly 'etag', for a response that has its own),
+        or, without If-None-Match, is at least as new as the version.
+        """
+        if_none_match = self.headers.get('If-None-Match')
+        if if_none_match is not None:
+            tags = [tag.strip() for tag in if_none_match.split(',')]
+            if etag is not None:
+                return any(tag == '*' or (tag[2:] if tag.startswith('W/') else tag) == etag for tag in tags)
+            return any(tag == '*' or version.matches_etag(tag) for tag in tags)
+
+        if_modified_since = self.headers.get('If-Modified-Since')
+        if if_modified_since:
+            try:
+                return int(parsedate_to_datetime(if_modified_since).timestamp()) >= version.mtime
+            except (TypeError, ValueError):
+                return False
+        return False
+
+    def if_range_matches(self, version):
+        """
+        True if a Range request may be answered with a part of this version:
+        there's no If-Range, or it names this version's uncompressed bytes.
+        """
+        if_range = self.headers.get('If-Range')
+        if if_range is None:
+            return True
+        if_range = if_range.strip()
+        if if_range.startswith('"'):
+            return if_range == version.etag
+        if if_range.startswith('W/'):
+            return False
         try:
-            if self.path == '/refresh':
-                driver(True)
-                self.send_response(200)
-                self.send_header('Content-Type', 'text/plain')
-                self.wfile.write(b'Refreshed the file!')
+            return int(parsedate_to_datetime(if_range).timestamp()) == version.mtime
+        except (TypeError, ValueError):
+            return False
+
+    def send_playlist(self, version=None):
+        self.send_cached(version or self.playlist_cache.get(), 'application/x-mpegurl', self.m3u_file)
+
+    def send_epg(self):
+        # Stored gzipped already, and sent as the .gz file players ask for
+        self.send_cached(self.epg_cache.get(), 'application/gzip', 'epg.xml.gz', compressible=False)
+
+    def send_cached(self, version, content_type, filename, compressible=True):
+        """
+        Sends a cached file version, answering conditional and Range requests
+        and, if 'compressible', negotiating its content coding.
+        """
+        coding = negotiate_encoding(self.headers.get('Accept-Encoding')) if compressible else None
+
+        byte_range = None
+        range_header = self.headers.get('Range')
+        if range_header and self.if_range_matches(version):
+            try:
+                byte_range = parse_range(range_header, len(version.body))
+            except ValueError:
+                self.send_response(416)
+                self.send_header('Content-Range', f'bytes */{len(version.body)}')
+                self.send_header('Content-Length', '0')
                 self.end_headers()
+                return
+            if byte_range is not None:
+                # Ranges index the uncompressed bytes, which is what resuming players expect
+                coding = None
+
+        if self.is_not_modified(version):
+            self.send_response(304)
+            self.send_header('ETag', version.etag_for(coding))
+            self.send_header('Last-Modified', version.last_modified)
+            if compressible:
+                self.send_header('Vary', 'Accept-Encoding')
+            self.end_headers()
+            return
+
+        body = version.encoded(coding) if coding else version.body
+        start, end = byte_range if byte_range is not None else (0, len(body))
+
+        # Send response
+        if byte_range is not None:
+            self.send_response(206)
+            self.send_header('Content-Range', f'bytes {start}-{end - 1}/{len(body)}')
+        else:
+            self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Disposition', f'attachment; filename="{filename}"')
+        self.send_header('Content-Length', str(end - start))
+        self.send_header('ETag', version.etag_for(coding))
+        self.send_header('Last-Modified', version.last_modified)
+        if compressible:
+            self.send_header('Vary', 'Accept-Encoding')
+        self.send_header('Accept-Ranges', 'bytes')
+        if coding:
+            self.send_header('Content-Encoding', coding)
+        self.end_headers()
+
+        # Write content
+        if self.command != 'HEAD':
+            if coding is None and version.file is not None:
+                # Zero-copy from the page cache straight to the socket
+                self.connection.sendfile(version.file, start, end - start)
             else:
-                # Read the M3U file
-                with open(self.m3u_file, 'r', encoding='utf-8') as file:
-                    content = file.read()
-
-                # Send response
-                self.send_response(200)
-                self.send_header('Content-Type', 'application/x-mpegurl')
-                self.send_header('Content-Disposition', f'attachment; filename="{self.m3u_file}"')
-                self.end_headers()
-                
-                # Write content
-                self.wfile.write(content.encode('utf-8'))
+                self.wfile.write(memoryview(body)[start:end])
+            registry.inc('iptv_http_response_bytes_total', end - start, {'encoding': coding or 'identity'})
+
+    def send_view(self, query):
+        """
+        Sends the playlist filtered for one client, by query parameters and/or
+        named profiles. Views are cut from the cached snapshot and its index,
+        and kept (with their compressed variants) until the playlist changes.
+        """
+        version = self.playlist_cache.get()
+        try:
+            view = view_from_query(query, self.profile_store.get())
+        except KeyError as e:
+            self.send_text(404, f'No such profile: {e.args[0]}'.encode('utf-8'))
+            return
+
+        def render():
+            index = self.playlist_cache.get_index(version)
+            body = b''.join(index.slices(version.body, select_entries(index, view)))
+            return PlaylistVersion((version.key, view.key), body, version.mtime)
+
+        self.send_playlist(self.view_cache.get(version, view, render))
+
+    def send_subset(self, kind, key):
+        """
+        Sends the playlist header plus the entries of one group, tvg-id or search,
+        sliced straight out of the cached playlist bytes.
+        """
+        if kind == 'search' and not key.strip():
+            self.send_text(400, b'Missing search query, use /search?q=...')
+            return
+
+        version = self.playlist_cache.get()
+        index = self.playlist_cache.get_index(version)
+        if kind == 'group':
+            entry_ids = index.group_entries(key)
+        elif kind == 'tvg':
+            entry_ids = index.tvg_entries(key)
+        else:
+            entry_ids = index.search(key)
+
+        if kind != 'search' and not entry_ids:
+            self.send_text(404, b'No such ' + kind.encode('utf-8'))
+            return
+
+        # The subset's own validator: it changes with the playlist, and differs per subset
+        subset_digest = hashlib.blake2b(f'{kind}\0{key}'.encode('utf-8'), digest_size=8).hexdigest()
+        etag = f'"{kind}-{subset_digest}-{version.digest}"'
+        if self.is_not_modified(version, etag):
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.send_header('Last-Modified', version.last_modified)
+            self.end_headers()
+            return
+
+        body = b''.join(index.slices(version.body, entry_ids))
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/x-mpegurl')
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('ETag', etag)
+        self.send_header('Last-Modified', version.last_modified)
+        self.end_headers()
+        if self.command != 'HEAD':
+            self.wfile.write(body)
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        route = route_for(url.path)
+        self.status_code = None
+        started = time.perf_counter()
+        try:
+            if route == 'group':
+                self.send_subset('group', unquote(url.path[len('/group/'):-len('.m3u')]))
+            elif route == 'tvg':
+                self.send_subset('tvg', unquote(url.path[len('/tvg/'):-len('.m3u')]))
+            elif route == 'profile':
+                self.send_view({'profile': [unquote(url.path[len('/profile/'):-len('.m3u')])]})
+            elif route == 'search':
+                self.send_subset('search', parse_qs(url.query).get('q', [''])[0])
+            elif route == 'refresh':
+                # The refresh drives a browser and a download, so keep it off the request path
+                started_refresh = self.refresh_scheduler.trigger()
+                self.send_json(202, {'started': started_refresh, **self.refresh_scheduler.status()})
+            elif route == 'refresh/status':
+                self.send_json(200, self.refresh_scheduler.status())
+            elif route == 'epg':
+                self.send_epg()
+            elif route == 'metrics':
+                self.send_text(200, registry.render().encode('utf-8'), 'text/plain; version=0.0.4; charset=utf-8')
+            else:
+                query = parse_qs(url.query)
+                if any(param in query for param in VIEW_PARAMS):
+                    self.send_view(query)
+                else:
+                    self.send_playlist()
         except FileNotFoundError:
-                self.send_response(404)
-                self.end_headers()
-                self.wfile.write(b'File not found')
+                self.send_text(404, b'File not found')
         except Exception as e:
-                self.send_response(500)
-                self.end_headers()
-                self.wfile.write(str(e).encode('utf-8'))
+                self.send_text(500, str(e).encode('utf-8'))
+        finally:
+            observe_request(route, self.status_code, time.perf_counter() - started)
 
-        
+    def do_HEAD(self):
+        self.do_GET()
+
+
+
+def _refresh_metrics(refresh_scheduler):
+    status = refresh_scheduler.status()
+    return {
+        'runs': status['runs'],
+        'coalesced': status['coalesced'],
+        'running': status['state'] == 'running',
+        'last_duration_seconds': status['last_duration'],
+        'last_ok': status['last_result'] == 'ok' if status['last_result'] else None,
+    }
+
+
+def run_server(port, m3u_file, mode='threaded', refresh_interval=None, refresh_fn=None,
+               profiles_filepath=DEFAULT_PROFILES_FILE, epg_file=None):
+    """
+    Serves the playlist until interrupted.
+
+    Args:
+        mode (str): 'threaded' handles each connection on its own thread, so a slow
+                    client doesn't hold up the others; 'single' serves one at a time.
+        refresh_interval (float, optional): Seconds between background refreshes.
+        refresh_fn (callable, optional): What a refresh runs, default driver(True).
+        profiles_filepath (str): JSON file of named views, served at /profile/<name>.m3u.
+        epg_file (str, optional): Gzipped guide served at /epg.xml.gz, default epg.xml.gz next to the playlist.
+    """
+    # Create handler class with the m3u_file parameter, and a cache and refresher shared by all requests
+    playlist_cache = PlaylistCache(m3u_file)
+    epg_cache = PlaylistCache(epg_file or default_epg_file(m3u_file))
+    refresh_scheduler = RefreshScheduler(refresh_fn or (lambda: driver(True)), refresh_interval)
+    refresh_scheduler.start()
+    registry.expose('iptv_refresh', lambda: _refresh_metrics(refresh_scheduler), 'gauge',
+                    'Background refresh state; runs and coalesced only ever grow.')
+    view_cache = ViewCache()
+    profile_store = ProfileStore(profiles_filepath)
+    registry.expose('iptv_view_cache', view_cache.stats, help_text='Filtered playlist view cache.')
+    handler = lambda *args: M3UHandler(m3u_file, *args, playlist_cache=playlist_cache,
+                                       refresh_scheduler=refresh_scheduler, view_cache=view_cache,
+                                       profile_store=profile_store, epg_cache=epg_cache)
 
-def run_server(port, m3u_file):
-    # Create handler class with the m3u_file parameter
-    handler = lambda *args: M3UHandler(m3u_file, *args)
-    
     # Create server
-    server = HTTPServer(('', port), handler)
-    print(f'Server started on port {port}')
+    server = SERVER_MODES[mode](('', port), handler)
+    server.daemon_threads = True
+    print(f'Server started on port {port} ({mode})')
     print(f'Serving M3U file: {m3u_file}')
     print(f'Access your playlist at: http://localhost:{port}')
-    
+
     try:
         server.serve_forever()
     except KeyboardInterrupt:
         print('\nShutting down server...')
+        refresh_scheduler.stop()
         server.server_close()
 
 def main():
     parser = argparse.ArgumentParser(description='Start an HTTP server to serve an M3U file')
     parser.add_argument('--port', type=int, default=8000, help='Port to run the server on (default: 8000)')
     parser.add_argument('--file', required=True, help='Path to the M3U file to serve')
-    
+    parser.add_argument('--mode', choices=sorted(SERVER_MODES), default='threaded',
+                        help='Serve connections concurrently or one at a time (default: threaded)')
+    parser.add_argument('--refresh-interval', type=float, default=None,
+                        help='Minutes between background refreshes (default: only on /refresh)')
+    parser.add_argument('--profile-dir', default=None,
+                        help='Dump a cProfile of every refresh into this directory')
+    parser.add_argument('--view-profiles', default=DEFAULT_PROFILES_FILE,
+                        help=f'JSON file of named filtered views (default: {DEFAULT_PROFILES_FILE})')
+
     args = parser.parse_args()
-    
-    run_server(args.port, args.file)
+
+    refresh_interval = args.refresh_interval * 60 if args.refresh_interval else None
+    run_server(args.port, args.file, args.mode, refresh_interval, profiled(lambda: driver(True), args.profile_dir),
+               args.view_profiles)
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    main()
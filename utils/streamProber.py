@@ -0,0 +1,195 @@
+# python -m utils.streamProber outputs/output.m3u outputs/live.m3u --mode move
+import json
+import time
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from utils.atomicFile import atomic_write
+from utils.declutterPlaylist import PlaylistEntry, GROUP_TITLE_RE, declutter_playlist
+
+DEFAULT_PROBE_CACHE = "outputs/probe_cache.json"
+
+
+def move_to_group(entry, group_title_value):
+    """
+    Sets an entry's group-title, adding the attribute if the tag has none.
+    """
+    if GROUP_TITLE_RE.search(entry.extinf):
+        entry.extinf = GROUP_TITLE_RE.sub(lambda _: f'group-title="{group_title_value}"', entry.extinf, count=1)
+    else:
+        # '#EXTINF:-1 attrs,Name' -> insert before the comma that starts the name
+        head, comma, name = entry.extinf.partition(',')
+        entry.extinf = f'{head} group-title="{group_title_value}"{comma}{name}'
+    return entry
+
+
+class StreamProber:
+    """
+    Checks that stream URLs answer, concurrently and with a per-host connection
+    limit, and remembers the verdicts on disk so they're only re-checked once
+    they expire.
+    """
+    def __init__(self, cache_filepath=DEFAULT_PROBE_CACHE, ttl=6 * 3600, dead_ttl=3600, timeout=(2, 3),
+                 max_workers=32, per_host=4, batch_size=512, mode='drop', dead_group='Dead'):
+        """
+        Args:
+            cache_filepath (str): JSON file holding {url: [alive, checked_at]}.
+            ttl (float): Seconds a live verdict stays valid.
+            dead_ttl (float): Seconds a dead verdict stays valid; shorter, so outages heal.
+            timeout (tuple): (connect, read) timeout per probe, in seconds.
+            max_workers (int): Probes in flight overall.
+            per_host (int): Probes in flight against any one host.
+            batch_size (int): Entries held in memory while their batch is probed.
+            mode (str): 'drop' removes dead entries; 'move' puts them in 'dead_group'.
+        """
+        self.cache_filepath = cache_filepath
+        self.ttl = ttl
+        self.dead_ttl = dead_ttl
+        self.timeout = timeout
+        self.max_workers = max_workers
+        self.per_host = per_host
+        self.batch_size = batch_size
+        self.mode = mode
+        self.dead_group = dead_group
+        self.stats = {'probed': 0, 'cached': 0, 'alive': 0, 'dead': 0}
+
+        self._cache = self._load_cache()
+        self._host_limits = {}
+        self._lock = threading.Lock()
+        self._session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=max_workers, pool_maxsize=per_host)
+        self._session.mount('http://', adapter)
+        self._session.mount('https://', adapter)
+
+    def _load_cache(self):
+        try:
+            with open(self.cache_filepath, 'r', encoding='utf-8') as cache_file:
+                return json.load(cache_file)
+        except (FileNotFoundError, ValueError):
+            return {}
+
+    def save(self):
+        now = time.time()
+        with self._lock:
+            # Only keep verdicts that are still valid
+            cache = {url: verdict for url, verdict in self._cache.items()
+                     if now - verdict[1] < (self.ttl if verdict[0] else self.dead_ttl)}
+        with atomic_write(self.cache_filepath) as cache_file:
+            json.dump(cache, cache_file)
+
+    def cached_verdict(self, url):
+        verdict = self._cache.get(url)
+        if verdict is None:
+            return None
+        alive, checked_at = verdict
+        if time.time() - checked_at >= (self.ttl if alive else self.dead_ttl):
+            return None
+        return alive
+
+    def _host_limit(self, url):
+        host = urlsplit(url).netloc
+        with self._lock:
+            limit = self._host_limits.get(host)
+            if limit is None:
+                limit = self._host_limits[host] = threading.BoundedSemaphore(self.per_host)
+            return limit
+
+    def probe(self, url):
+        """
+        True if the stream answers: a successful HEAD, or, for servers that don't
+        do HEAD, a successful partial GET of its first kilobyte.
+        """
+        with self._host_limit(url):
+            try:
+                with self._session.head(url, timeout=self.timeout, allow_redirects=True) as response:
+                    if response.status_code < 400:
+                        return True
+                    if response.status_code not in (403, 405, 501):
+                        return False
+                with self._session.get(url, timeout=self.timeout, stream=True, allow_redirects=True,
+                                       headers={'Range': 'bytes=0-1023'}) as response:
+                    if response.status_code >= 400:
+                        return False
+                    next(response.iter_content(1024), None)
+                    return True
+            except requests.exceptions.RequestException:
+                return False
+
+    def _probe_and_record(self, url):
+        alive = self.probe(url)
+        with self._lock:
+            self._cache[url] = [alive, time.time()]
+            self.stats['probed'] += 1
+        return alive
+
+    def check(self, urls, pool):
+        """
+        Returns {url: alive} for the given URLs, probing the uncached ones concurrently.
+        """
+        verdicts = {}
+        to_probe = []
+        for url in set(urls):
+            alive = self.cached_verdict(url)
+            if alive is None:
+                to_probe.append(url)
+            else:
+                verdicts[url] = alive
+                self.stats['cached'] += 1
+        for url, alive in zip(to_probe, pool.map(self._probe_and_record, to_probe)):
+            verdicts[url] = alive
+        return verdicts
+
+    def filter(self, items, stats=None):
+        """
+        Pipeline stage over a stream of parsed items: probes entries a batch at a
+        time and drops (or regroups) the dead ones. Raw lines pass through.
+        Dropped entries are taken off stats['entries_out'], if given.
+        """
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            batch = []
+            for item in items:
+                batch.append(item)
+                if len(batch) >= self.batch_size:
+                    yield from self._filter_batch(batch, pool, stats)
+                    batch = []
+            yield from self._filter_batch(batch, pool, stats)
+        self.save()
+
+    def _filter_batch(self, batch, pool, stats):
+        urls = [item.url.strip() for item in batch if isinstance(item, PlaylistEntry)]
+        verdicts = self.check(urls, pool)
+        for item in batch:
+            if isinstance(item, PlaylistEntry):
+                if verdicts[item.url.strip()]:
+                    self.stats['alive'] += 1
+                else:
+                    self.stats['dead'] += 1
+                    if self.mode != 'move':
+                        if stats is not None:
+                            stats['entries_out'] -= 1
+                        continue
+                    move_to_group(item, self.dead_group)
+            yield item
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Drop (or regroup) dead streams from an M3U playlist.")
+    parser.add_argument("input_file", help="Path to the input .m3u file.")
+    parser.add_argument("output_file", help="Path to the output .m3u file.")
+    parser.add_argument("--mode", choices=['drop', 'move'], default='drop',
+                        help="Drop dead entries, or move them to the 'Dead' group (default: drop)")
+    parser.add_argument("--cache", default=DEFAULT_PROBE_CACHE, help=f"Probe cache file (default: {DEFAULT_PROBE_CACHE})")
+
+    args = parser.parse_args()
+
+    prober = StreamProber(args.cache, mode=args.mode)
+    declutter_playlist(args.input_file, args.output_file, stages=[], prober=prober)
+    print(f"Probe results: {prober.stats}")
+
+if __name__ == "__main__":
+    main()
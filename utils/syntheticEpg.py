@@ -0,0 +1,61 @@
+import time
+import random
+import argparse
+from xml.sax.saxutils import escape, quoteattr
+
+from utils.playlistIndex import PlaylistIndex
+
+_TITLES = ["Morning News", "Live Football", "Cartoon Hour", "Top 40", "Wildlife", "Late Movie", "Talk Show", "Weather"]
+
+
+def generate_epg(output_filepath, playlist_filepath, programmes_per_channel=24, seed=0, start=None):
+    """
+    Writes a synthetic XMLTV guide covering every tvg-id in a playlist, one
+    hour-long programme after another, as a provider's full guide would.
+
+    Args:
+        output_filepath (str): Where to write the guide.
+        playlist_filepath (str): Playlist (e.g. from syntheticPlaylist) whose tvg-ids get channels.
+        programmes_per_channel (int): Programmes listed for each channel.
+        seed (int): Random seed, so runs are reproducible.
+        start (float, optional): Epoch seconds of the first programme; defaults to the current hour.
+
+    Returns:
+        int: Number of channels written.
+    """
+    rng = random.Random(seed)
+    with open(playlist_filepath, 'rb') as playlist_file:
+        tvg_ids = sorted(PlaylistIndex.build(playlist_file).tvg_ranges)
+    start = int(start if start is not None else time.time()) // 3600 * 3600
+
+    with open(output_filepath, 'w', encoding='utf-8') as outfile:
+        outfile.write('<?xml version="1.0" encoding="UTF-8"?>\n<!DOCTYPE tv SYSTEM "xmltv.dtd">\n')
+        outfile.write('<tv generator-info-name="syntheticEpg">\n')
+        for tvg_id in tvg_ids:
+            outfile.write(f'<channel id={quoteattr(tvg_id)}><display-name>{escape(tvg_id)}</display-name>'
+                          f'<icon src="http://provider.example/logos/{escape(tvg_id)}.png"/></channel>\n')
+        for tvg_id in tvg_ids:
+            for slot in range(programmes_per_channel):
+                begin = time.strftime('%Y%m%d%H%M%S +0000', time.gmtime(start + slot * 3600))
+                end = time.strftime('%Y%m%d%H%M%S +0000', time.gmtime(start + (slot + 1) * 3600))
+                title = rng.choice(_TITLES)
+                outfile.write(f'<programme start="{begin}" stop="{end}" channel={quoteattr(tvg_id)}>'
+                              f'<title lang="en">{title}</title>'
+                              f'<desc lang="en">{title} on {escape(tvg_id)} &amp; more.</desc></programme>\n')
+        outfile.write('</tv>\n')
+    return len(tvg_ids)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a synthetic XMLTV guide for a playlist.")
+    parser.add_argument("output_file", help="Path to the output .xml file.")
+    parser.add_argument("playlist_file", help="Playlist whose tvg-ids the guide covers.")
+    parser.add_argument("--programmes", type=int, default=24, help="Programmes per channel (default: 24)")
+
+    args = parser.parse_args()
+
+    channels = generate_epg(args.output_file, args.playlist_file, args.programmes)
+    print(f"Wrote {channels} channels to '{args.output_file}'.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+import random
+import argparse
+
+_NOISE_LINES = [
+    "[status] Playing macro iptv/freeiptv2023\n",
+    "[info] Executing:  | open | https://provider.example/free-trial | |\n",
+    "[info] Executing:  | click | xpath=//button[@id='generate'] | |\n",
+    "[info] Executing:  | storeText | id=username | username |\n",
+    "[info] Executing:  | storeText | id=password | password |\n",
+    "[info] Executing:  | echo | m3uLink = ${m3uLink} | |\n",
+    "[info] Macro completed (Runtime 14.21s)\n",
+]
+
+
+def m3u_link(run, host="http://provider.example:8080"):
+    return f"{host}/get.php?username=user{run:06d}&password=pass{run:06d}&type=m3u_plus&output=ts"
+
+
+def generate_log(output_filepath, size_mb, runs=None, seed=0):
+    """
+    Writes a synthetic UI.Vision log, as left by 'savelog' appending one macro
+    run after another, each echoing a fresh m3u link.
+
+    Args:
+        output_filepath (str): Where to write the log.
+        size_mb (float): Approximate size of the log in MB.
+        runs (int, optional): Macro runs to spread across the log; defaults to one per ~64 KB.
+        seed (int): Random seed, so runs are reproducible.
+
+    Returns:
+        str: The last (newest) m3u link written.
+    """
+    rng = random.Random(seed)
+    target_size = int(size_mb * 1024 * 1024)
+    runs = runs or max(1, target_size // (64 * 1024))
+    bytes_per_run = target_size // runs
+
+    last_link = None
+    with open(output_filepath, 'w', encoding='utf-8') as outfile:
+        for run in range(runs):
+            written = 0
+            # Noise first, so every run ends with its link like a real macro run
+            while written < bytes_per_run:
+                line = rng.choice(_NOISE_LINES)
+                outfile.write(line)
+                written += len(line)
+            last_link = m3u_link(run)
+            outfile.write(f"[echo] m3uLink = {last_link}\n")
+            outfile.write(_NOISE_LINES[-1])
+    return last_link
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a synthetic UI.Vision log for benchmarking.")
+    parser.add_argument("output_file", help="Path to the output log file.")
+    parser.add_argument("--size-mb", type=float, default=300, help="Approximate size in MB (default: 300)")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed (default: 0)")
+
+    args = parser.parse_args()
+
+    link = generate_log(args.output_file, args.size_mb, seed=args.seed)
+    print(f"Wrote '{args.output_file}', newest link: {link}")
+
+if __name__ == "__main__":
+    main()
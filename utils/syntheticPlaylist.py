@@ -0,0 +1,86 @@
+import random
+import argparse
+
+# Language prefixes seen in provider group-titles, e.g. "FR| CINEMA"
+DEFAULT_LANGUAGES = ["UK", "US", "IN", "CA", "FR", "DE", "ES", "IT", "PT", "AR", "NL", "PL", "SE", "GR", "TELUGU", "KANNADA"]
+DEFAULT_CATEGORIES = ["NEWS", "SPORTS", "MOVIES", "KIDS", "MUSIC", "DOCUMENTARY", "ENTERTAINMENT", "REGIONAL", "VIP", "HD", "4K", "24/7"]
+
+
+def parse_mix(spec):
+    """
+    Parses a group mix like "UK:5,US:3,FR" into (names, weights); a name without
+    a weight counts 1.
+    """
+    names, weights = [], []
+    for item in spec.split(','):
+        name, _, weight = item.strip().partition(':')
+        if name:
+            names.append(name)
+            weights.append(float(weight) if weight else 1.0)
+    return names, weights
+
+
+def generate_playlist(output_filepath, entries, languages=None, categories=None, seed=0,
+                      host="http://provider.example:8080", username="user", password="pass",
+                      language_weights=None, category_weights=None):
+    """
+    Writes a synthetic Xtream-style M3U playlist for benchmarking.
+
+    Args:
+        output_filepath (str): Where to write the playlist.
+        entries (int): Number of #EXTINF entries.
+        languages (list, optional): Group-title prefixes to mix in.
+        categories (list, optional): Group-title suffixes to mix in.
+        seed (int): Random seed, so runs are reproducible.
+        language_weights (list, optional): Relative share of each language; uniform if None.
+        category_weights (list, optional): Relative share of each category; uniform if None.
+
+    Returns:
+        str: output_filepath
+    """
+    rng = random.Random(seed)
+    languages = languages or DEFAULT_LANGUAGES
+    categories = categories or DEFAULT_CATEGORIES
+    # A real provider has a few hundred distinct groups
+    groups = [f"{lang}| {category}" for lang in languages for category in categories]
+
+    with open(output_filepath, 'w', encoding='utf-8') as outfile:
+        outfile.write("#EXTM3U\n")
+        for stream_id in range(1, entries + 1):
+            if language_weights or category_weights:
+                language = rng.choices(languages, language_weights)[0]
+                category = rng.choices(categories, category_weights)[0]
+                group = f"{language}| {category}"
+            else:
+                group = rng.choice(groups)
+            name = f"{group.split('|')[0]}: Channel {stream_id}"
+            outfile.write(
+                f'#EXTINF:-1 tvg-id="ch{stream_id}.{group[:2].lower()}" tvg-name="{name}" '
+                f'tvg-logo="{host}/logos/{stream_id}.png" group-title="{group}",{name}\n'
+            )
+            if stream_id % 50 == 0:
+                outfile.write("#EXTVLCOPT:http-user-agent=VLC/3.0\n")
+            outfile.write(f"{host}/live/{username}/{password}/{stream_id}.ts\n")
+    return output_filepath
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a synthetic M3U playlist for benchmarking.")
+    parser.add_argument("output_file", help="Path to the output .m3u file.")
+    parser.add_argument("--entries", type=int, default=100000, help="Number of entries (default: 100000)")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed (default: 0)")
+    parser.add_argument("--languages", default=None,
+                        help="Language mix, e.g. 'UK:5,US:3,FR:1' (default: every built-in language, evenly)")
+    parser.add_argument("--categories", default=None,
+                        help="Category mix, e.g. 'SPORTS:2,NEWS' (default: every built-in category, evenly)")
+
+    args = parser.parse_args()
+
+    languages, language_weights = parse_mix(args.languages) if args.languages else (None, None)
+    categories, category_weights = parse_mix(args.categories) if args.categories else (None, None)
+    generate_playlist(args.output_file, args.entries, languages, categories, seed=args.seed,
+                      language_weights=language_weights, category_weights=category_weights)
+    print(f"Wrote {args.entries} entries to '{args.output_file}'.")
+
+if __name__ == "__main__":
+    main()
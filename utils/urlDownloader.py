@@ -1,17 +1,163 @@
 import requests
 import os
-import shutil
-from urllib.parse import urlparse # For parsing the URL to get a potential filename
+import re
+import json
+import hashlib
+import threading
+import time
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from urllib.parse import urlparse, unquote # For parsing the URL to get a potential filename
 
-def download_file(url, save_directory, overwrite=False, custom_filename=None):
+from utils.atomicFile import atomic_write
+
+CHUNK_SIZE = 1024 * 1024         # Read the body 1 MB at a time
+WRITE_BUFFER_SIZE = 4 * 1024 * 1024
+MAX_RESUMES = 5                  # Reconnects after a dropped connection before giving up
+CONNECT_TIMEOUT = 10
+READ_TIMEOUT = 30
+
+# 'bytes 100-199/1000', or 'bytes */1000' on a 416
+CONTENT_RANGE_RE = re.compile(r'bytes\s+(?:(\d+)-(\d+)|\*)/(\d+|\*)', re.IGNORECASE)
+
+# Upstream validators and content hashes of past downloads, kept in the save directory
+DOWNLOAD_META_FILE = "download_meta.json"
+
+# How often conditional downloads avoided work, for logging and metrics
+download_counters = {'downloaded': 0, 'not_modified': 0, 'unchanged': 0}
+
+_session = None
+_session_lock = threading.Lock()
+# Parallel downloads into one directory share its metadata file
+_meta_lock = threading.Lock()
+
+
+def get_session():
+    """
+    Returns the shared requests.Session, so connections to the provider are pooled
+    and reused across downloads.
+    """
+    global _session
+    with _session_lock:
+        if _session is None:
+            session = requests.Session()
+            retries = Retry(total=3, backoff_factor=0.5, status_forcelist=(502, 503, 504),
+                            allowed_methods=frozenset(['GET', 'HEAD']))
+            adapter = HTTPAdapter(pool_connections=8, pool_maxsize=16, max_retries=retries)
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+            _session = session
+        return _session
+
+
+def filename_from_response(response, url):
+    """
+    Works out a filename from Content-Disposition, falling back to the URL path.
+    """
+    content_disposition = response.headers.get('content-disposition')
+    if content_disposition:
+        # Example: attachment; filename="actual_filename.jpg" or filename*=UTF-8''actual%20name.jpg
+        match = re.search(r"filename\*\s*=\s*[^']*''([^;]+)", content_disposition, re.IGNORECASE)
+        if match:
+            return os.path.basename(unquote(match.group(1).strip('"\' ')))
+        match = re.search(r'filename\s*=\s*("[^"]*"|[^;]+)', content_disposition, re.IGNORECASE)
+        if match:
+            return os.path.basename(match.group(1).strip('"\' ')) # Remove quotes and spaces
+    return os.path.basename(urlparse(url).path)
+
+
+def parse_content_range(value):
+    """
+    Parses a Content-Range header into (start, end, total), any of which is None
+    when the server left it out. Returns None if the header is missing or malformed.
+    """
+    match = CONTENT_RANGE_RE.match((value or '').strip())
+    if not match:
+        return None
+    start, end, total = match.groups()
+    return (int(start) if start else None, int(end) if end else None,
+            int(total) if total != '*' else None)
+
+
+def load_download_meta(save_directory):
+    """
+    Returns {url: {'path', 'etag', 'last_modified', 'sha256', 'bytes_per_second'}} for past downloads.
+    """
+    meta_path = os.path.join(save_directory, DOWNLOAD_META_FILE)
+    try:
+        with open(meta_path, 'r', encoding='utf-8') as meta_file:
+            return json.load(meta_file)
+    except (FileNotFoundError, ValueError):
+        return {}
+
+
+def save_download_meta(save_directory, url, record):
+    """
+    Records one download, keeping the others. Safe to call from several threads at once.
+    """
+    with _meta_lock:
+        meta = load_download_meta(save_directory)
+        meta[url] = record
+        # Forget downloads whose file has since been cleaned up
+        meta = {key: value for key, value in meta.items() if os.path.exists(value.get('path', ''))}
+        with atomic_write(os.path.join(save_directory, DOWNLOAD_META_FILE)) as meta_file:
+            json.dump(meta, meta_file, indent=2)
+
+
+def _print_progress(downloaded_size, total_size):
+    # Basic progress (can be made prettier with tqdm)
+    progress = int(50 * downloaded_size / total_size) if total_size else 0
+    print(f"\r[{'#' * progress}{'.' * (50 - progress)}] {downloaded_size/1024:.2f}KB / {total_size/1024:.2f}KB", end="")
+
+
+def _stream_to_file(response, file, downloaded_size, total_size, hasher, show_progress=True):
+    """
+    Appends the response body to 'file', feeding it to 'hasher' as well,
+    and returns the new byte count.
+    If the connection drops, the exception carries on up with the bytes
+    written so far recorded on it.
+    """
+    try:
+        for chunk in response.iter_content(chunk_size=CHUNK_SIZE):
+            if chunk: # filter out keep-alive new chunks
+                file.write(chunk)
+                hasher.update(chunk)
+                downloaded_size += len(chunk)
+                if show_progress:
+                    _print_progress(downloaded_size, total_size)
+    except (requests.exceptions.ChunkedEncodingError, requests.exceptions.ConnectionError,
+            requests.exceptions.Timeout) as e:
+        e.downloaded_size = downloaded_size
+        raise
+    return downloaded_size
+
+
+def download_file(url, save_directory, overwrite=False, custom_filename=None, stats=None, conditional=False,
+                  show_progress=True):
     """
     Downloads a file from a given URL and saves it to a specified directory.
 
+    The filename and the body come from a single GET on a pooled session. The
+    body is written to a '.part' file and renamed into place when complete; if
+    the connection drops, the download resumes with a Range request.
+
     Args:
         url (str): The URL of the file to download.
         save_directory (str): The directory where the file should be saved.
         custom_filename (str, optional): A custom name for the saved file.
                                          If None, tries to infer from URL or Content-Disposition.
+        stats (dict, optional): Filled in with 'bytes', 'seconds', 'resumes', 'path',
+                                'sha256', 'changed' and 'bytes_per_second' (for a 304,
+                                the throughput recorded by the last real download).
+        conditional (bool): Revalidate a previous download of this URL instead of
+                            fetching it blindly. The upstream ETag/Last-Modified and a
+                            SHA-256 of the content are kept in DOWNLOAD_META_FILE; a 304,
+                            or a body with the same hash, leaves the existing file in
+                            place and reports 'changed' as False. Implies overwrite.
+        show_progress (bool): Print a progress bar; turn off when downloading in parallel.
+
+    Returns:
+        str or False: The saved path, or False on failure.
     """
     print(f"Attempting to download from: {url}")
     print(f"Saving to directory: {save_directory}")
@@ -24,68 +170,147 @@ def download_file(url, save_directory, overwrite=False, custom_filename=None):
         print(f"Error creating directory {save_directory}: {e}")
         return False
 
-    # 2. Get the filename
-    if custom_filename:
-        filename = custom_filename
-    else:
-        try:
-            # Try to get filename from Content-Disposition header first
-            with requests.get(url, stream=True, timeout=10) as r_head: # Short timeout for headers
-                r_head.raise_for_status() # Raise an exception for bad status codes
-                content_disposition = r_head.headers.get('content-disposition')
-                if content_disposition:
-                    # Example: "attachment; filename="actual_filename.jpg""
-                    # A more robust parser might be needed for complex cases
-                    parts = content_disposition.split('filename=')
-                    if len(parts) > 1:
-                        filename = parts[1].strip('"\' ') # Remove quotes and spaces
-                    else: # Fallback if 'filename=' not found but header exists
-                        filename = os.path.basename(urlparse(url).path)
-                else:
-                    # Fallback to URL parsing if no Content-Disposition
-                    filename = os.path.basename(urlparse(url).path)
+    session = get_session()
+    part_path = None
+    started = time.perf_counter()
+
+    previous = None
+    request_headers = {}
+    if conditional:
+        overwrite = True
+        previous = load_download_meta(save_directory).get(url)
+        if previous and os.path.exists(previous['path']):
+            if previous.get('etag'):
+                request_headers['If-None-Match'] = previous['etag']
+            if previous.get('last_modified'):
+                request_headers['If-Modified-Since'] = previous['last_modified']
+        else:
+            previous = None
+
+    try:
+        # 2. One request gives us both the filename and the content
+        with session.get(url, stream=True, headers=request_headers, timeout=(CONNECT_TIMEOUT, READ_TIMEOUT)) as r:
+            if r.status_code == 304 and previous:
+                download_counters['not_modified'] += 1
+                print(f"Not modified upstream, keeping '{previous['path']}' "
+                      f"(skipped {download_counters['not_modified']} times so far)")
+                if stats is not None:
+                    stats.update({'bytes': 0, 'seconds': time.perf_counter() - started, 'resumes': 0,
+                                  'path': previous['path'], 'sha256': previous['sha256'], 'changed': False,
+                                  'bytes_per_second': previous.get('bytes_per_second')})
+                return previous['path']
 
+            r.raise_for_status() # Raise an exception for bad status codes (4xx or 5xx)
+
+            filename = custom_filename or filename_from_response(r, url)
             if not filename: # If URL ends with / or path is empty
                 filename = "downloaded_file"
                 print(f"Could not determine filename, using default: '{filename}'")
 
-        except requests.exceptions.RequestException as e:
-            print(f"Error fetching headers or initial connection: {e}")
-            return False
-        except Exception as e:
-            print(f"An unexpected error occurred while trying to determine filename: {e}")
-            return False
-
-    save_path = os.path.join(save_directory, filename)
-    print(f"Resolved save path: {save_path}")
-    
-    
-      # Check if file already exists
-    if not overwrite and os.path.exists(save_path):
-        print(f"File '{save_path}' already exists and overwrite is set to False. Skipping download.")
-        return save_path
+            save_path = os.path.join(save_directory, filename)
+            print(f"Resolved save path: {save_path}")
 
+            # Check if file already exists
+            if not overwrite and os.path.exists(save_path):
+                print(f"File '{save_path}' already exists and overwrite is set to False. Skipping download.")
+                return save_path
 
-    # 3. Download the file
-    try:
-        with requests.get(url, stream=True, timeout=30) as r: # Longer timeout for content
-            r.raise_for_status() # Raise an exception for bad status codes (4xx or 5xx)
             total_size = int(r.headers.get('content-length', 0))
-            
+            # Byte offsets only line up with the file on disk when the body isn't content-encoded
+            resumable = r.headers.get('content-encoding', 'identity').lower() == 'identity'
+            validator = r.headers.get('etag') or r.headers.get('last-modified')
+
             print(f"Downloading '{filename}' ({total_size / (1024*1024):.2f} MB)...")
-            
-            with open(save_path, 'wb') as f:
-                downloaded_size = 0
-                for chunk in r.iter_content(chunk_size=8192): # 8KB chunks
-                    if chunk: # filter out keep-alive new chunks
-                        f.write(chunk)
-                        downloaded_size += len(chunk)
-                        # Basic progress (can be made prettier with tqdm)
-                        progress = int(50 * downloaded_size / total_size) if total_size else 0
-                        print(f"\r[{'#' * progress}{'.' * (50 - progress)}] {downloaded_size/1024:.2f}KB / {total_size/1024:.2f}KB", end="")
-            print("\nDownload complete!")
-            print(f"File saved as: {save_path}")
-            return save_path
+
+            # 3. Download the file
+            part_path = save_path + '.part'
+            downloaded_size = 0
+            resumes = 0
+            hasher = hashlib.sha256()
+            with open(part_path, 'wb', buffering=WRITE_BUFFER_SIZE) as f:
+                response = r
+                while True:
+                    try:
+                        downloaded_size = _stream_to_file(response, f, downloaded_size, total_size, hasher, show_progress)
+                        break
+                    except (requests.exceptions.ChunkedEncodingError, requests.exceptions.ConnectionError,
+                            requests.exceptions.Timeout) as e:
+                        downloaded_size = getattr(e, 'downloaded_size', downloaded_size)
+                        if resumes >= MAX_RESUMES:
+                            raise
+                        resumes += 1
+                        if response is not r:
+                            response.close()
+
+                        headers = {}
+                        if resumable and downloaded_size:
+                            headers['Range'] = f'bytes={downloaded_size}-'
+                            if validator:
+                                headers['If-Range'] = validator
+                        print(f"\nConnection dropped at {downloaded_size} bytes, resuming ({resumes}/{MAX_RESUMES})...")
+                        response = session.get(url, stream=True, headers=headers, timeout=(CONNECT_TIMEOUT, READ_TIMEOUT))
+                        content_range = parse_content_range(response.headers.get('content-range'))
+                        if response.status_code == 416 and downloaded_size:
+                            # The connection dropped after the last byte, so there's nothing left to ask for
+                            complete_size = content_range[2] if content_range and content_range[2] is not None else total_size
+                            if downloaded_size == complete_size:
+                                print("Already have every byte, nothing left to resume")
+                                break
+                        response.raise_for_status()
+                        if response.status_code == 206 and (
+                                content_range is None or content_range[0] != downloaded_size
+                                or (total_size and content_range[2] not in (None, total_size))):
+                            # The part doesn't carry on where the file stops: fetch the whole body instead
+                            print(f"Server resumed at {content_range[0] if content_range else 'an unknown offset'}, starting over...")
+                            response.close()
+                            response = session.get(url, stream=True, timeout=(CONNECT_TIMEOUT, READ_TIMEOUT))
+                            response.raise_for_status()
+                        if response.status_code != 206:
+                            # Server ignored the Range (or the file changed): start over
+                            f.seek(0)
+                            f.truncate()
+                            downloaded_size = 0
+                            hasher = hashlib.sha256()
+                if response is not r:
+                    response.close()
+
+            if resumable and total_size and downloaded_size < total_size:
+                raise IOError(f"Incomplete download: got {downloaded_size} of {total_size} bytes")
+
+            sha256 = hasher.hexdigest()
+            changed = not (previous and previous['path'] == save_path and previous['sha256'] == sha256)
+            if changed:
+                os.replace(part_path, save_path)
+            else:
+                # Same bytes as the file we already have: drop the copy rather than replace it
+                os.remove(part_path)
+            part_path = None
+
+            elapsed = time.perf_counter() - started
+            bytes_per_second = downloaded_size / elapsed if elapsed else 0.0
+            if conditional:
+                save_download_meta(save_directory, url, {
+                    'path': save_path,
+                    'etag': r.headers.get('etag'),
+                    'last_modified': r.headers.get('last-modified'),
+                    'sha256': sha256,
+                    'bytes_per_second': bytes_per_second,
+                })
+
+        if changed:
+            download_counters['downloaded'] += 1
+        else:
+            download_counters['unchanged'] += 1
+            print(f"\nContent unchanged (sha256 {sha256[:12]}), keeping '{save_path}' "
+                  f"(unchanged {download_counters['unchanged']} times so far)")
+        throughput = bytes_per_second / (1024 * 1024)
+        print("\nDownload complete!")
+        print(f"File saved as: {save_path}")
+        print(f"Downloaded {downloaded_size / (1024*1024):.2f} MB in {elapsed:.2f}s ({throughput:.2f} MB/s, {resumes} resumes)")
+        if stats is not None:
+            stats.update({'bytes': downloaded_size, 'seconds': elapsed, 'resumes': resumes, 'path': save_path,
+                          'sha256': sha256, 'changed': changed, 'bytes_per_second': bytes_per_second})
+        return save_path
     except requests.exceptions.HTTPError as e:
         print(f"HTTP Error occurred: {e.response.status_code} - {e.response.reason}")
     except requests.exceptions.ConnectionError as e:
@@ -100,13 +325,13 @@ def download_file(url, save_directory, overwrite=False, custom_filename=None):
         print(f"An unexpected error occurred: {e}")
 
     # Clean up partially downloaded file if an error occurred
-    if os.path.exists(save_path) and downloaded_size < total_size :
+    if part_path and os.path.exists(part_path):
         try:
-            os.remove(save_path)
-            print(f"Partially downloaded file '{save_path}' removed.")
+            os.remove(part_path)
+            print(f"Partially downloaded file '{part_path}' removed.")
         except OSError as e_rem:
-            print(f"Error removing partially downloaded file '{save_path}': {e_rem}")
-            
+            print(f"Error removing partially downloaded file '{part_path}': {e_rem}")
+
     return False
 
 if __name__ == "__main__":
@@ -126,7 +351,7 @@ if __name__ == "__main__":
 
     # --- Execution ---
     print("--- File Downloader ---")
-    if download_file(file_url, custom_dir, new_filename):
+    if download_file(file_url, custom_dir, custom_filename=new_filename):
         print("--- Process finished successfully. ---")
     else:
         print("--- Process failed. ---")
@@ -134,4 +359,4 @@ if __name__ == "__main__":
     # Example with custom filename
     # print("\n--- Downloading with custom filename ---")
     # another_url = "https://www.google.com/images/branding/googlelogo/1x/googlelogo_color_272x92dp.png"
-    # download_file(another_url, custom_dir, "google_logo_custom.png")
+    # download_file(another_url, custom_dir, custom_filename="google_logo_custom.png")
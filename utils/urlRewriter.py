@@ -0,0 +1,65 @@
+import re
+
+# Xtream Codes stream paths: scheme://host/<type>/<username>/<password>/<stream id>.<ext>
+XTREAM_STREAM_TYPES = ('live', 'movie', 'series')
+
+
+class CredentialRewriter:
+    """
+    Swaps the credentials in Xtream stream URLs for another account's.
+
+    The provider's path template is compiled once into a single regex, whose
+    first match in a URL (the same segment the old split-and-scan loop found)
+    has its username and password segments replaced. URLs of any other shape
+    pass through unchanged.
+    """
+    __slots__ = ('username', 'password', 'stream_types', '_split', '_credentials')
+
+    def __init__(self, username, password, stream_types=XTREAM_STREAM_TYPES):
+        self.username = username
+        self.password = password
+        self.stream_types = tuple(stream_types)
+        types = "|".join(re.escape(stream_type) for stream_type in self.stream_types)
+        # '/live/' + two whole segments, as the old loop did, usually followed by the stream id.
+        # Splitting on it (rather than sub() with a template) leaves the '/live/' part
+        # captured and the credentials out, so they're replaced by plain concatenation.
+        self._split = re.compile(rf'(/(?:{types})/)[^/\s]+/[^/\s]+(?=[/\s]|$)', re.IGNORECASE).split
+        self._credentials = f"{username}/{password}"
+
+    def rewrite(self, url):
+        """
+        Rewrites one URL; a trailing line ending is kept as is.
+        """
+        if "://" not in url:
+            return url
+        parts = self._split(url, 1)
+        if len(parts) == 1:
+            return url
+        return parts[0] + parts[1] + self._credentials + parts[2]
+
+    def rewrite_lines(self, text):
+        """
+        Rewrites a whole newline-separated buffer of URLs in one pass. Every URL
+        line must be absolute; only put URL lines in the buffer, as any
+        Xtream-shaped path in it is rewritten.
+        """
+        parts = self._split(text)
+        credentials = self._credentials
+        # [text, '/live/', text, '/movie/', text, ...]: the credentials go after each captured type
+        parts[1::2] = [stream_type + credentials for stream_type in parts[1::2]]
+        return "".join(parts)
+
+
+def url_rewriter(url_part1, url_part2, stream_types=XTREAM_STREAM_TYPES):
+    """
+    Builds a stage that rewrites 'scheme://host/live/old1/old2/stream.ts' (and the
+    /movie/ and /series/ equivalents) to use url_part1/url_part2 as the credentials.
+    """
+    rewriter = CredentialRewriter(url_part1, url_part2, stream_types)
+    rewrite = rewriter.rewrite
+
+    def stage(entry):
+        entry.url = rewrite(entry.url)
+        return entry
+    stage.key = ('url_rewriter', url_part1, url_part2, rewriter.stream_types)
+    return stage